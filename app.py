@@ -4,21 +4,32 @@ load_dotenv()
 
 # 2. Інші імпорти
 import os
+import time
 import uuid
 from datetime import datetime, date, timedelta, timezone
-from flask import Flask, render_template, request, redirect, url_for, session, make_response, abort, flash, Response, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, make_response, abort, flash, Response, jsonify, send_file
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 
 # 3. Локальні імпорти
 from utils import detect_platform 
-from services.telegram_parser import get_telegram_data
+from services.telegram_parser import get_telegram_data, get_telegram_data_many, get_telegram_data_deep, DEEP_MAX_POSTS, PRO_ONLY_FIELDS, get_cache_stats
+from services.telegram_client_manager import get_client_manager
+from services.entity_index import get_index_stats
+from services.telegram_errors import TelegramFetchError
+from services.request_scheduler import LANE_PDF, LANE_BACKGROUND
+from services.analysis_jobs import (ANALYZE_ASYNC, submit_analysis_job, get_analysis_job,
+                                    DONE as JOB_DONE, ERROR as JOB_ERROR)
 from services.billing import create_fondy_checkout_url
-from services.pdf_generator import generate_pdf_report
+from services.pdf_pool import render_pdf, warm_up_pdf_pool, PdfRenderBusyError, PdfRenderTimeoutError
+from services.portfolio_report import submit_portfolio_job, get_portfolio_job, report_path
 from services.export_service import generate_csv
 from services.email_service import init_app_mail, send_password_reset_email
 from services.insights_generator import generate_pro_insights
-from models import db, User, TrackedAccount, AnalyticsHistory, init_app_db
+from services.dashboard_refresher import start_dashboard_refresher
+from services.history_rollup import get_history_points
+from services.result_store import save_result, get_result, content_hash, get_rendered_pdf, save_rendered_pdf
+from models import db, User, Channel, TrackedAccount, AnalyticsHistory, init_app_db, upgrade_db
 from forms import LoginForm, RegistrationForm, CompareForm, RequestPasswordResetForm, ResetPasswordForm
 from sqlalchemy.exc import IntegrityError 
 
@@ -39,6 +50,12 @@ if database_url and database_url.startswith("postgres://"):
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///project.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 init_app_db(app)
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Створює таблиці та виконує міграції схеми (для DB_AUTO_MIGRATE=false)."""
+    upgrade_db()
+    print("Міграції бази даних виконано.")
 # --- *** КІНЕЦЬ ВИПРАВЛЕННЯ *** ---
 
 
@@ -57,6 +74,14 @@ login_manager.init_app(app)
 login_manager.login_view = 'login' 
 login_manager.login_message = 'Будь ласка, увійдіть, щоб отримати доступ до цієї сторінки.'
 
+# --- ПЛАНОВЕ ОНОВЛЕННЯ ДАШБОРДУ ---
+# Потік є в кожному воркері, але оновлення виконує лише один (файловий lock)
+start_dashboard_refresher(app)
+
+# --- ПУЛ РЕНДЕРИНГУ PDF ---
+# Процеси зі шрифтами та стилями піднімаються одразу, а не на першому звіті
+warm_up_pdf_pool()
+
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
@@ -171,29 +196,24 @@ def index():
             session['last_analysis_date'] = today
         limit_count = session.get('analysis_count', 0)
         remaining = 3 - limit_count
-    return render_template('index.html', error=error, last_url=last_url, remaining=remaining)
+    return render_template('index.html', error=error, last_url=last_url, remaining=remaining,
+                           deep_max_posts=DEEP_MAX_POSTS)
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
     url = request.form.get('social_url')
     is_pro = current_user.is_authenticated and current_user.check_pro_status()
-    session.pop('analysis_result', None)
+    session.pop('analysis_result_id', None)
     session.pop('analysis_error', None)
     session.pop('analysis_url', None)
+    # Старі сесії зберігали повний результат у cookie
+    session.pop('analysis_result', None)
+    session.pop('last_analysis', None)
+    session.pop('last_platform', None)
 
-    if not is_pro:
-        is_limit_reached = False
-        if current_user.is_authenticated:
-            if check_rate_limit(current_user): is_limit_reached = True
-        else:
-            today = str(date.today())
-            if session.get('last_analysis_date') != today:
-                session['analysis_count'] = 0
-                session['last_analysis_date'] = today
-            if session.get('analysis_count', 0) >= 3: is_limit_reached = True
-        if is_limit_reached:
-            session['analysis_error'] = "Ви вичерпали ліміт (3 аналізи на день). Увійдіть або оновіть до Pro."
-            return redirect(url_for('index')) 
+    if not is_pro and _analysis_limit_reached():
+        session['analysis_error'] = ANALYSIS_LIMIT_ERROR
+        return redirect(url_for('index'))
     
     if not url:
         session['analysis_error'] = "Будь ласка, введіть URL."
@@ -202,13 +222,33 @@ def analyze():
     platform = detect_platform(url)
     data = None
     error = None
+    deep = bool(is_pro and request.form.get('deep_analysis'))
+
+    if platform == 'telegram' and ANALYZE_ASYNC:
+        # Фоновий режим: воркер не чекає на Telegram, сторінка статусу опитує задачу
+        job_id, error = submit_analysis_job(url, is_pro_user=is_pro, deep=deep)
+        if error:
+            session['analysis_error'] = error
+            session['analysis_url'] = url
+            return redirect(url_for('index'))
+        session['analysis_jobs'] = (session.get('analysis_jobs', []) + [job_id])[-10:]
+        if not is_pro:
+            # Аналіз зараховується одразу при постановці в чергу, інакше можна
+            # поставити скільки завгодно задач до завершення першої; при помилці - повертаємо
+            _count_analysis(1)
+            session['charged_analysis_jobs'] = (session.get('charged_analysis_jobs', []) + [job_id])[-10:]
+        return redirect(url_for('analysis_status', job_id=job_id))
 
     try:
         if platform == 'telegram':
-            data = get_telegram_data(url, is_pro_user=is_pro)
-            if not data: error = "Не вдалося отримати дані з Telegram."
+            if deep:
+                data = get_telegram_data_deep(url, raise_errors=True)
+            else:
+                data = get_telegram_data(url, is_pro_user=is_pro, raise_errors=True)
         else:
             error = "Непідтримуване посилання. Введіть URL Telegram-каналу (t.me/...)."
+    except TelegramFetchError as e:
+        error = e.user_message
     except Exception as e:
         print(f"Сталася помилка при обробці {url}: {e}")
         error = f"Сталася внутрішня помилка: {e}"
@@ -218,34 +258,129 @@ def analyze():
         session['analysis_url'] = url
         return redirect(url_for('index'))
 
-    if not is_pro:
-        if current_user.is_authenticated:
-            current_user.analysis_count += 1
-            current_user.last_analysis_date = date.today()
+    return _complete_analysis(url, platform, data, is_pro)
+
+
+ANALYSIS_LIMIT_ERROR = "Ви вичерпали ліміт (3 аналізи на день). Увійдіть або оновіть до Pro."
+
+def _analysis_limit_reached():
+    """Чи вичерпано денний ліміт безкоштовних аналізів (користувача або анонімної сесії)."""
+    if current_user.is_authenticated:
+        return check_rate_limit(current_user)
+    today = str(date.today())
+    if session.get('last_analysis_date') != today:
+        session['analysis_count'] = 0
+        session['last_analysis_date'] = today
+    return session.get('analysis_count', 0) >= 3
+
+def _count_analysis(delta):
+    """Додає (1) або повертає (-1) аналіз у денний ліміт."""
+    if current_user.is_authenticated:
+        today = date.today()
+        if current_user.last_analysis_date != today:
+            if delta < 0:
+                return  # ліміт уже скинувся - повертати нічого
+            current_user.analysis_count = 0
+            current_user.last_analysis_date = today
             db.session.commit()
-        else:
-            session['analysis_count'] = (session.get('analysis_count', 0) + 1)
-            session['last_analysis_date'] = str(date.today())
+        # Атомарно в БД: паралельні запити того самого користувача не перезаписують один одного
+        query = User.query.filter(User.id == current_user.id)
+        if delta < 0:
+            query = query.filter(User.analysis_count > 0)
+        query.update({User.analysis_count: User.analysis_count + delta}, synchronize_session=False)
+        db.session.commit()
+        db.session.refresh(current_user)
+    else:
+        today = str(date.today())
+        if session.get('last_analysis_date') != today:
+            if delta < 0:
+                return
+            session['analysis_count'] = 0
+            session['last_analysis_date'] = today
+        session['analysis_count'] = max(session.get('analysis_count', 0) + delta, 0)
+
+def _complete_analysis(url, platform, data, is_pro, counted=False):
+    """
+    Облік ліміту, інсайти та збереження результату після успішного аналізу.
+    counted - аналіз уже зараховано в ліміт при постановці задачі в чергу.
+    """
+    if not is_pro and not counted:
+        _count_analysis(1)
 
     if is_pro and data:
         insights = generate_pro_insights(data)
         data['insights'] = insights
 
-    session['analysis_result'] = data
+    # Результат - у серверному сховищі, у сесії лише його id
+    result_id = save_result({'data': data, 'url': url, 'platform': platform})
+    session['analysis_result_id'] = result_id
+    session['last_analysis_id'] = result_id
     session['analysis_url'] = url
-    session['last_analysis'] = data 
-    session['last_platform'] = platform 
 
     return redirect(url_for('show_result'))
 
 
+def _own_analysis_job(job_id):
+    """Задача, яку поставила в чергу поточна сесія, або None."""
+    if job_id not in session.get('analysis_jobs', []):
+        return None
+    return get_analysis_job(job_id)
+
+
+@app.route('/analyze/job/<job_id>')
+def analysis_status(job_id):
+    job = _own_analysis_job(job_id)
+    if not job:
+        return redirect(url_for('index'))
+    return render_template('analysis_status.html', job=job, poll_interval_ms=1000)
+
+
+@app.route('/analyze/job/<job_id>/status')
+def analysis_status_json(job_id):
+    job = _own_analysis_job(job_id)
+    if not job:
+        return jsonify({'status': 'not_found'}), 404
+    return jsonify({
+        'status': job['status'],
+        'progress': job.get('progress'),
+        'error': job.get('error'),
+    })
+
+
+@app.route('/analyze/job/<job_id>/finish')
+def analysis_finish(job_id):
+    job = _own_analysis_job(job_id)
+    if not job:
+        return redirect(url_for('index'))
+    if job['status'] not in (JOB_DONE, JOB_ERROR):
+        return redirect(url_for('analysis_status', job_id=job_id))
+
+    session['analysis_jobs'] = [j for j in session.get('analysis_jobs', []) if j != job_id]
+    counted = job_id in session.get('charged_analysis_jobs', [])
+    session['charged_analysis_jobs'] = [j for j in session.get('charged_analysis_jobs', []) if j != job_id]
+    if job['status'] == JOB_ERROR or not job.get('data'):
+        if counted:
+            _count_analysis(-1)  # невдалий аналіз не займає ліміт
+        session['analysis_error'] = job.get('error') or "Не вдалося отримати дані з Telegram."
+        session['analysis_url'] = job['url']
+        return redirect(url_for('index'))
+
+    # Задачу могли поставити до того, як аналізи почали зараховуватись при постановці
+    if not job['is_pro'] and not counted and _analysis_limit_reached():
+        session['analysis_error'] = ANALYSIS_LIMIT_ERROR
+        return redirect(url_for('index'))
+
+    return _complete_analysis(job['url'], 'telegram', job['data'], job['is_pro'], counted=counted)
+
+
 @app.route('/result')
 def show_result():
-    data = session.get('analysis_result')
-    url = session.get('analysis_url')
-    if not data:
+    result = get_result(session.get('analysis_result_id'))
+    if not result or not result.get('data'):
         return redirect(url_for('index'))
     
+    data = result['data']
+    url = result['url']
     platform = data.get('platform', 'unknown')
     return render_template('result.html', data=data, platform=platform, url=url)
 
@@ -255,7 +390,7 @@ def export_csv():
     if not current_user.is_pro:
         flash('Експорт в CSV доступний лише для Pro-акаунтів.', 'warning')
         return redirect(url_for('index'))
-    data = session.get('last_analysis')
+    data = (get_result(session.get('last_analysis_id')) or {}).get('data')
     if not data:
         flash('Немає даних для експорту. Будь ласка, проведіть аналіз.', 'info')
         return redirect(url_for('index'))
@@ -286,9 +421,11 @@ def compare_page():
 def compare_analyze():
     if not current_user.is_pro: abort(403)
     form = CompareForm()
+    session.pop('compare_result_id', None)
+    session.pop('compare_error', None)
+    # Старі сесії зберігали обидва результати у cookie
     session.pop('compare_data1', None)
     session.pop('compare_data2', None)
-    session.pop('compare_error', None)
     
     if form.validate_on_submit():
         url1 = form.url1.data
@@ -302,8 +439,9 @@ def compare_analyze():
         
         try:
             is_pro = current_user.is_pro
-            data1 = get_telegram_data(url1, is_pro_user=is_pro)
-            data2 = get_telegram_data(url2, is_pro_user=is_pro)
+            results = get_telegram_data_many([url1, url2], is_pro_user=is_pro)
+            data1 = results[url1]['data']
+            data2 = results[url2]['data']
 
             if not data1 or not data2:
                 flash('Не вдалося отримати дані для одного з акаунтів.', 'danger')
@@ -313,8 +451,7 @@ def compare_analyze():
                 data1['insights'] = generate_pro_insights(data1)
                 data2['insights'] = generate_pro_insights(data2)
 
-            session['compare_data1'] = data1
-            session['compare_data2'] = data2
+            session['compare_result_id'] = save_result({'data1': data1, 'data2': data2})
             return redirect(url_for('compare_result_page'))
         except Exception as e:
             print(f"Помилка порівняння: {e}")
@@ -328,8 +465,9 @@ def compare_analyze():
 @login_required
 def compare_result_page():
     if not current_user.is_pro: return redirect(url_for('upgrade_page'))
-    data1 = session.get('compare_data1')
-    data2 = session.get('compare_data2')
+    result = get_result(session.get('compare_result_id')) or {}
+    data1 = result.get('data1')
+    data2 = result.get('data2')
     if not data1 or not data2:
         flash('Немає даних для порівняння. Будь ласка, спробуйте ще раз.', 'info')
         return redirect(url_for('compare_page'))
@@ -337,6 +475,16 @@ def compare_result_page():
     platform = data1.get('platform', 'unknown')
     return render_template('compare_result.html', data1=data1, data2=data2, platform=platform)
 
+# Дані аналізу, старші за цей поріг, для PDF оновлюються з Telegram
+PDF_DATA_MAX_AGE_SECONDS = int(os.environ.get('PDF_DATA_MAX_AGE_SECONDS', 15 * 60))
+
+def _pdf_needs_fresh_data(data):
+    """Збережений результат не годиться для PDF: застарів або без Pro-метрик (аналіз до оновлення тарифу)."""
+    if not data or any(field not in data for field in PRO_ONLY_FIELDS):
+        return True
+    fetched_at = data.get('fetched_at')
+    return not fetched_at or time.time() - fetched_at > PDF_DATA_MAX_AGE_SECONDS
+
 @app.route('/download-pdf')
 @login_required 
 def download_pdf_report():
@@ -344,31 +492,44 @@ def download_pdf_report():
         flash('Доступ до PDF-звітів є лише у Pro-акаунтів.', 'warning')
         return redirect(url_for('upgrade_page'))
 
-    url = session.get('analysis_url')
-    platform = session.get('last_platform')
+    result_id = session.get('last_analysis_id')
+    result = get_result(result_id) or {}
+    url = result.get('url')
+    platform = result.get('platform')
     
     if not url or not platform:
         flash('Немає даних для звіту. Будь ласка, проведіть аналіз.', 'info')
         return redirect(url_for('index'))
 
-    print(f"Запускаємо 'свіжий' аналіз для PDF-звіту для {url}...")
-    try:
-        if platform == 'telegram':
-            data = get_telegram_data(url, is_pro_user=True, force_fresh=True) 
-        else:
-            data = None 
+    # Звіт будується з результату, який користувач уже бачить;
+    # до Telegram ідемо лише за ?refresh=1 або якщо дані застаріли
+    data = result.get('data')
+    if request.args.get('refresh') == '1' or _pdf_needs_fresh_data(data):
+        print(f"Запускаємо 'свіжий' аналіз для PDF-звіту для {url}...")
+        try:
+            if platform == 'telegram':
+                data = get_telegram_data(url, is_pro_user=True, force_fresh=True, lane=LANE_PDF)
+            else:
+                data = None 
 
-        if not data:
-            flash('Не вдалося отримати свіжі дані для PDF-звіту.', 'danger')
-            return redirect(url_for('show_result'))
-        
-        if current_user.is_pro:
+            if not data:
+                flash('Не вдалося отримати свіжі дані для PDF-звіту.', 'danger')
+                return redirect(url_for('show_result'))
+            
             data['insights'] = generate_pro_insights(data)
 
-    except Exception as e:
-        print(f"Помилка під час 'свіжого' аналізу для PDF: {e}")
-        flash('Сталася помилка під час оновлення даних для звіту.', 'danger')
-        return redirect(url_for('show_result'))
+        except Exception as e:
+            print(f"Помилка під час 'свіжого' аналізу для PDF: {e}")
+            flash('Сталася помилка під час оновлення даних для звіту.', 'danger')
+            return redirect(url_for('show_result'))
+
+        # Свіжі дані стають поточним результатом (і для сторінки результату)
+        new_result_id = save_result({'data': data, 'url': url, 'platform': platform})
+        if session.get('analysis_result_id') == result_id:
+            session['analysis_result_id'] = new_result_id
+        session['last_analysis_id'] = result_id = new_result_id
+    elif 'insights' not in data:
+        data['insights'] = generate_pro_insights(data)
     
     avatar_path = data.get('avatar_path')
     history = None
@@ -381,32 +542,60 @@ def download_pdf_report():
         ).first()
         
         if tracked_acc:
-            history = tracked_acc.get_recent_history(days=7)
-            
-        pdf_buffer = generate_pdf_report(data, platform, history=history, avatar_path=avatar_path) 
-        
+            history = get_history_points(tracked_acc.channel_id, days=7)
+
         filename_name = data.get('username', data.get('name', 'report')).replace(" ", "_")
         filename = f"{platform}_{filename_name}_report.pdf"
 
-        response = make_response(pdf_buffer.getvalue())
+        digest = content_hash(data, [(h.date, h.subscribers, h.er) for h in history or []])
+        pdf_bytes = get_rendered_pdf(result_id, digest)
+        if pdf_bytes is None:
+            pdf_bytes = render_pdf(data, platform, history=history, avatar_path=avatar_path)
+            save_rendered_pdf(result_id, digest, pdf_bytes)
+        else:
+            print(f"[PDF CACHE] Звіт для {url} віддано з кешу")
+
+        response = make_response(pdf_bytes)
         response.headers['Content-Type'] = 'application/pdf'
         response.headers['Content-Disposition'] = f'attachment; filename={filename}'
         return response
     
+    except (PdfRenderBusyError, PdfRenderTimeoutError) as e:
+        flash(str(e), "warning")
+        return redirect(url_for('show_result'))
     except Exception as e:
         print(f"Помилка генерації PDF: {e}")
         flash(f"Помилка генерації PDF: {e}", "danger")
         return redirect(url_for('index'))
-    
-    finally:
-        if avatar_path and os.path.exists(avatar_path):
-            try:
-                os.remove(avatar_path)
-                print(f"Тимчасову аватарку {avatar_path} видалено.")
-            except Exception as e:
-                print(f"Помилка видалення аватарки {avatar_path}: {e}")
 
 # --- РОУТИ ДАШБОРДА ---
+DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 50))
+CHART_MAX_DAYS = 5 * 365
+CHART_METRICS = {
+    'subscribers': 'Підписники',
+    'er': 'ER (%)',
+    'avg_views': 'Середні перегляди',
+    'posts_per_day': 'Постів на день',
+    'reaction_rate': 'Реакції (%)',
+    'min_views': 'Мін. перегляди',
+    'max_views': 'Макс. перегляди',
+}
+
+def _format_dashboard_cursor(cursor):
+    """(date_added, id) -> рядок для ?after="""
+    if cursor is None:
+        return None
+    date_added, account_id = cursor
+    return f"{date_added.isoformat()}_{account_id}"
+
+def _parse_dashboard_cursor(raw):
+    if not raw:
+        return None
+    try:
+        date_part, id_part = raw.rsplit('_', 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except ValueError:
+        return None  # пошкоджений курсор - показуємо першу сторінку
 @app.route('/dashboard')
 @login_required
 def dashboard():
@@ -414,9 +603,14 @@ def dashboard():
         flash('Дашборд доступний лише для Pro-користувачів.', 'warning')
         return redirect(url_for('upgrade_page'))
 
-    tracked_accounts = sorted(current_user.tracked_accounts, key=lambda x: x.date_added, reverse=True)
+    cursor = _parse_dashboard_cursor(request.args.get('after'))
+    accounts, next_cursor = TrackedAccount.page_with_latest(current_user.id, limit=DASHBOARD_PAGE_SIZE, cursor=cursor)
+    total_accounts = TrackedAccount.query.filter_by(user_id=current_user.id).count()
     return render_template('dashboard.html', 
-                           accounts=tracked_accounts, 
+                           accounts=accounts, 
+                           total_accounts=total_accounts,
+                           next_cursor=_format_dashboard_cursor(next_cursor),
+                           is_first_page=cursor is None,
                            datetime=datetime, 
                            timedelta=timedelta)
 
@@ -437,16 +631,13 @@ def refresh_account(account_id):
 
     try:
         print(f"Примусове оновлення для {acc.username}...")
-        data = get_telegram_data(acc.url, is_pro_user=True, force_fresh=True)
+        data = get_telegram_data(acc.url, is_pro_user=True, force_fresh=True, lane=LANE_BACKGROUND)
         
         if data and not data.get('is_private'):
-            new_history_entry = AnalyticsHistory(
-                tracked_account_id=acc.id,
-                subscribers=data.get('subscribers'),
-                er=data.get('er', 0)
-            )
+            # Знімок належить каналу - його побачать усі, хто цей канал відстежує
+            new_history_entry = AnalyticsHistory(**AnalyticsHistory.snapshot_row(acc.channel_id, data))
             db.session.add(new_history_entry)
-            acc.last_updated = datetime.utcnow()
+            acc.channel.last_updated = datetime.utcnow()
             db.session.commit()
             flash(f'Дані для @{acc.username} успішно оновлено.', 'success')
         else:
@@ -478,8 +669,10 @@ def track_account():
         return redirect(url_for('index'))
         
     try:
+        channel = Channel.get_or_create(platform, url, username, account_name)
         new_tracked_account = TrackedAccount(
             user_id=current_user.id,
+            channel=channel,
             platform=platform,
             username=username,
             account_name=account_name,
@@ -489,17 +682,16 @@ def track_account():
         db.session.add(new_tracked_account)
         db.session.commit() 
         
-        data = session.get('last_analysis')
-        if data and data.get('username') == username:
+        # Перший знімок - лише для нового каналу; в іншому разі історія вже є
+        data = (get_result(session.get('last_analysis_id')) or {}).get('data')
+        has_history = AnalyticsHistory.query.filter_by(channel_id=channel.id).first() is not None
+        if data and data.get('username') == username and not has_history:
             if 'insights' not in data:
                  data['insights'] = generate_pro_insights(data)
 
-            first_history_entry = AnalyticsHistory(
-                tracked_account_id=new_tracked_account.id,
-                subscribers=data.get('subscribers'),
-                er=data.get('er', 0)
-            )
+            first_history_entry = AnalyticsHistory(**AnalyticsHistory.snapshot_row(channel.id, data))
             db.session.add(first_history_entry)
+            channel.last_updated = datetime.utcnow()
             db.session.commit()
         
         flash(f'Канал @{username} успішно додано у ваш Дашборд!', 'success')
@@ -544,8 +736,8 @@ def dashboard_view_account(account_id):
     if not account or account.user_id != current_user.id:
         flash('Акаунт не знайдено.', 'danger')
         return redirect(url_for('dashboard'))
-    history = account.get_recent_history(days=30)
-    return render_template('dashboard_view.html', account=account, history=history)
+    history = get_history_points(account.channel_id, days=30)
+    return render_template('dashboard_view.html', account=account, history=history, chart_metrics=CHART_METRICS)
 
 
 @app.route('/api/get-chart-data/<int:account_id>')
@@ -555,10 +747,94 @@ def get_chart_data(account_id):
     account = TrackedAccount.query.get(account_id)
     if not account or account.user_id != current_user.id:
         abort(404)
-    history = account.get_recent_history(days=30)
+    # ?days= - діапазон графіка; довгі діапазони читаються з денних/тижневих агрегатів
+    days = min(max(request.args.get('days', 30, type=int), 1), CHART_MAX_DAYS)
+    # ?metric= - будь-яка метрика зі знімків історії (без запиту до Telegram)
+    metric = request.args.get('metric', 'subscribers')
+    if metric not in CHART_METRICS:
+        abort(400)
+    history = get_history_points(account.channel_id, days=days)
     labels = [h.date.strftime('%Y-%m-%d') for h in history]
-    values = [h.subscribers for h in history]
-    return jsonify({ 'labels': labels, 'values': values })
+    values = [getattr(h, metric) for h in history]
+    return jsonify({ 'labels': labels, 'values': values, 'metric': metric, 'label': CHART_METRICS[metric] })
+
+# --- ПОРТФЕЛЬНИЙ PDF-ЗВІТ (усі канали дашборду) ---
+def _own_portfolio_job(job_id):
+    """Задача портфельного звіту поточного користувача або None."""
+    job = get_portfolio_job(job_id)
+    if not job or job['user_id'] != current_user.id:
+        return None
+    return job
+
+@app.route('/dashboard/portfolio-report', methods=['POST'])
+@login_required
+def portfolio_report():
+    if not current_user.is_pro:
+        flash('Портфельний звіт доступний лише для Pro-користувачів.', 'warning')
+        return redirect(url_for('upgrade_page'))
+    if not TrackedAccount.query.filter_by(user_id=current_user.id).first():
+        flash('Додайте хоча б один канал у Дашборд.', 'info')
+        return redirect(url_for('dashboard'))
+    job_id = submit_portfolio_job(app, current_user.id)
+    return redirect(url_for('portfolio_report_status', job_id=job_id))
+
+@app.route('/dashboard/portfolio-report/<job_id>')
+@login_required
+def portfolio_report_status(job_id):
+    if not current_user.is_pro: abort(403)
+    job = _own_portfolio_job(job_id)
+    if not job:
+        return redirect(url_for('dashboard'))
+    return render_template('portfolio_status.html', job=job, poll_interval_ms=2000)
+
+@app.route('/dashboard/portfolio-report/<job_id>/status')
+@login_required
+def portfolio_report_status_json(job_id):
+    if not current_user.is_pro: abort(403)
+    job = _own_portfolio_job(job_id)
+    if not job:
+        return jsonify({'status': 'not_found'}), 404
+    return jsonify({
+        'status': job['status'],
+        'progress': job.get('progress'),
+        'error': job.get('error'),
+    })
+
+@app.route('/dashboard/portfolio-report/<job_id>/download')
+@login_required
+def portfolio_report_download(job_id):
+    if not current_user.is_pro: abort(403)
+    job = _own_portfolio_job(job_id)
+    if not job:
+        flash('Звіт не знайдено або термін його зберігання минув.', 'info')
+        return redirect(url_for('dashboard'))
+    if job['status'] == JOB_ERROR:
+        flash(job.get('error') or 'Не вдалося сформувати звіт.', 'danger')
+        return redirect(url_for('dashboard'))
+    if job['status'] != JOB_DONE or not os.path.exists(report_path(job_id)):
+        return redirect(url_for('portfolio_report_status', job_id=job_id))
+    # Файл віддається з диска частинами, без читання в пам'ять воркера
+    return send_file(report_path(job_id), mimetype='application/pdf', as_attachment=True,
+                     download_name=f"portfolio_report_{datetime.utcnow().strftime('%Y-%m-%d')}.pdf")
+
+# --- МОНІТОРИНГ (лише для адміністраторів з ADMIN_EMAILS) ---
+ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+@app.route('/admin/telegram-stats')
+@login_required
+def admin_telegram_stats():
+    """Навантаження сесій Telegram, черги планувальника та кешів поточного воркера."""
+    if current_user.email.lower() not in ADMIN_EMAILS: abort(404)
+    try:
+        telegram = get_client_manager().health()
+    except ValueError as e:
+        telegram = {'error': str(e)}  # Telegram не налаштований
+    return jsonify({
+        'pid': os.getpid(),
+        'telegram': telegram,
+        'analytics_cache': get_cache_stats(),
+        'entity_index': get_index_stats(),
+    })
 
 # --- РОУТИ МОНЕТИЗАЦІЇ (Fondy) (без змін) ---
 @app.route('/upgrade')
@@ -0,0 +1,11 @@
+# Конфігурація gunicorn (підхоплюється автоматично з робочої директорії)
+
+
+def worker_exit(server, worker):
+    """Зупиняємо фонові задачі воркера та коректно відключаємо пул клієнтів Telegram."""
+    from services.dashboard_refresher import stop_dashboard_refresher
+    from services.pdf_pool import shutdown_pdf_pool
+    from services.telegram_client_manager import shutdown_client_manager
+    stop_dashboard_refresher()
+    shutdown_pdf_pool()
+    shutdown_client_manager()
@@ -1,19 +1,82 @@
 import os
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from datetime import date, datetime, timedelta, timezone
+from datetime import date, datetime, timezone
 from itsdangerous import URLSafeTimedSerializer as Serializer
 from flask import current_app 
+from sqlalchemy.exc import IntegrityError
+from contextlib import contextmanager
+from utils import normalize_channel_url
+from services.single_flight import LOCK_DIR, fcntl
 
 db = SQLAlchemy()
 
+# Міграції схеми при старті. Кілька хостів з однією БД: вимкніть і запускайте `flask db-upgrade`
+DB_AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE', 'true').lower() in ['true', 'on', '1']
+_MIGRATION_LOCK_PATH = os.path.join(LOCK_DIR, 'db_upgrade.lock')
+
 def init_app_db(app):
     """Ініціалізує та створює таблиці БД"""
     db.init_app(app)
+    if not DB_AUTO_MIGRATE:
+        return
     with app.app_context():
-        db.create_all()
+        upgrade_db()
         print("База даних 'project.db' успішно ініціалізована (з Дашбордом).")
 
+@contextmanager
+def _migration_lock():
+    """Ексклюзивний файловий lock: воркери gunicorn та bot.py стартують одночасно."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(_MIGRATION_LOCK_PATH, 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def upgrade_db():
+    """
+    Створює таблиці та виконує одноразові міграції (потребує контексту застосунку).
+    Процеси виконують її по черзі: наступний бачить уже оновлену схему і нічого не робить.
+    """
+    with _migration_lock():
+        db.create_all()
+        _upgrade_schema()
+        _backfill_channels()
+
+def _upgrade_schema():
+    """
+    create_all() не змінює наявні таблиці, тож колонки та індекси, додані
+    до моделей пізніше, створюємо тут. Додаються лише nullable-колонки
+    без значень за замовчуванням на рівні БД (решта потребує міграції).
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable or column.server_default is not None:
+                print(f"ПОПЕРЕДЖЕННЯ: колонку {table.name}.{column.name} потрібно додати міграцією")
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            except Exception:
+                # Колонку щойно додав інший процес (напр. інший хост без спільного lock)
+                if column.name not in {c['name'] for c in db.inspect(db.engine).get_columns(table.name)}:
+                    raise
+                continue
+            print(f"Додано колонку {table.name}.{column.name}")
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
 # Модель користувача
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -57,13 +120,64 @@ class User(UserMixin, db.Model):
             return None
         return User.query.get(user_id)
 
+# --- НОВА ТАБЛИЦЯ ---
+class Channel(db.Model):
+    """
+    Канонічний канал: один на всіх користувачів, що його відстежують.
+    Йому належить історія знімків, тож зберігання й оновлення
+    масштабуються з кількістю каналів, а не підписок.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    platform = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(255), nullable=False)  # канонічний ключ (normalize_channel_url)
+    username = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(255))
+    url = db.Column(db.String(255), nullable=False)
+
+    date_added = db.Column(db.DateTime, default=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime(2000, 1, 1))
+
+    subscriptions = db.relationship('TrackedAccount', backref='channel', lazy=True)
+    history = db.relationship('AnalyticsHistory', backref='channel', lazy=True, cascade="all, delete-orphan")
+    rollups = db.relationship('AnalyticsRollup', backref='channel', lazy=True, cascade="all, delete-orphan")
+
+    __table_args__ = (db.UniqueConstraint('platform', 'key', name='_channel_key_uc'),)
+
+    def __repr__(self):
+        return f'<Channel {self.key} ({self.platform})>'
+
+    @staticmethod
+    def channel_key(platform, url, username):
+        if platform == 'telegram':
+            return normalize_channel_url(url) or username.lower()
+        return username.lower()
+
+    @staticmethod
+    def get_or_create(platform, url, username, name=None):
+        """Канонічний канал для посилання (паралельне створення - через unique constraint)."""
+        key = Channel.channel_key(platform, url, username)
+        channel = Channel.query.filter_by(platform=platform, key=key).first()
+        if channel is not None:
+            if name and channel.name != name:
+                channel.name = name
+            return channel
+        channel = Channel(platform=platform, key=key, username=username, name=name, url=url)
+        try:
+            with db.session.begin_nested():
+                db.session.add(channel)
+        except IntegrityError:
+            channel = Channel.query.filter_by(platform=platform, key=key).one()
+        return channel
+
 # --- НОВА ТАБЛИЦЯ ---
 class TrackedAccount(db.Model):
     """
-    Акаунт, який користувач додав у свій "Дашборд" для відстеження.
+    Підписка користувача на канал у його "Дашборді".
+    Історія знімків належить каналу (Channel) і спільна для всіх підписників.
     """
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    channel_id = db.Column(db.Integer, db.ForeignKey('channel.id'), index=True)
     
     platform = db.Column(db.String(20), nullable=False) # 'telegram' or 'instagram'
     username = db.Column(db.String(100), nullable=False)
@@ -71,11 +185,7 @@ class TrackedAccount(db.Model):
     url = db.Column(db.String(255), nullable=False) # Посилання
     
     date_added = db.Column(db.DateTime, default=datetime.utcnow)
-    last_updated = db.Column(db.DateTime, default=datetime(2000, 1, 1))
-    
-    # --- НОВИЙ ЗВ'ЯЗОК ---
-    # Дозволяє нам писати account.history
-    history = db.relationship('AnalyticsHistory', backref='account', lazy=True, cascade="all, delete-orphan")
+    last_updated = db.Column(db.DateTime, default=datetime(2000, 1, 1))  # застаріле: див. Channel.last_updated
     
     # Створюємо індекс, щоб user_id + username були унікальними
     __table_args__ = (db.UniqueConstraint('user_id', 'username', 'platform', name='_user_account_uc'),)
@@ -83,25 +193,63 @@ class TrackedAccount(db.Model):
     def __repr__(self):
         return f'<TrackedAccount {self.username} (Owner: {self.user_id})>'
 
-    def get_recent_history(self, days=7):
-        """Отримує історію за останні N днів"""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        return AnalyticsHistory.query.filter(
-            AnalyticsHistory.tracked_account_id == self.id,
-            AnalyticsHistory.date >= cutoff_date
-        ).order_by(AnalyticsHistory.date.asc()).all()
-        
-    def get_latest_data(self):
-        """Отримує останній запис історії"""
-        return AnalyticsHistory.query.filter_by(tracked_account_id=self.id).order_by(AnalyticsHistory.date.desc()).first()
+    @staticmethod
+    def page_with_latest(user_id, limit=50, cursor=None):
+        """
+        Сторінка акаунтів користувача (новіші першими) разом з каналом та його
+        останнім знімком - двома запитами на сторінку незалежно від її розміру.
+        cursor - (date_added, id) останнього акаунта попередньої сторінки (keyset).
+        Повертає ([(TrackedAccount, Channel, AnalyticsHistory | None), ...], наступний cursor | None).
+        """
+        query = db.session.query(TrackedAccount, Channel
+        ).join(Channel, Channel.id == TrackedAccount.channel_id
+        ).filter(TrackedAccount.user_id == user_id)
+        if cursor is not None:
+            date_added, account_id = cursor
+            query = query.filter(db.or_(
+                TrackedAccount.date_added < date_added,
+                db.and_(TrackedAccount.date_added == date_added, TrackedAccount.id < account_id)
+            ))
+        rows = query.order_by(TrackedAccount.date_added.desc(), TrackedAccount.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_account = rows[-1][0]
+            next_cursor = (last_account.date_added, last_account.id)
+
+        # Останній знімок - лише для каналів сторінки, за індексом (channel_id, date).
+        # Дата, а не id: перенесені зі старої таблиці записи мають id не в хронологічному порядку
+        latest = {}
+        channel_ids = {channel.id for _, channel in rows}
+        if channel_ids:
+            latest_dates = db.session.query(
+                AnalyticsHistory.channel_id.label('channel_id'),
+                db.func.max(AnalyticsHistory.date).label('date')
+            ).filter(AnalyticsHistory.channel_id.in_(channel_ids)
+            ).group_by(AnalyticsHistory.channel_id).subquery()
+            # (channel_id, date) унікальні, тож на канал припадає рівно один знімок
+            snapshots = AnalyticsHistory.query.join(latest_dates, db.and_(
+                AnalyticsHistory.channel_id == latest_dates.c.channel_id,
+                AnalyticsHistory.date == latest_dates.c.date
+            )).all()
+            latest = {snapshot.channel_id: snapshot for snapshot in snapshots}
+        return [(account, channel, latest.get(channel.id)) for account, channel in rows], next_cursor
+
+# Метрики, що зберігаються в кожному знімку історії та його агрегатах
+SNAPSHOT_METRICS = ('subscribers', 'er', 'avg_views', 'posts_per_day', 'reaction_rate', 'min_views', 'max_views')
+_INTEGER_METRICS = ('subscribers', 'avg_views', 'min_views', 'max_views')
 
 # --- НОВА ТАБЛИЦЯ ---
 class AnalyticsHistory(db.Model):
     """
-    Знімок аналітики (запис у часі) для відстежуваного акаунта.
+    Знімок аналітики (запис у часі) каналу.
     """
+    # Нова таблиця: стара analytics_history зберігала копію на кожного користувача
+    __tablename__ = 'channel_history'
+
     id = db.Column(db.Integer, primary_key=True)
-    tracked_account_id = db.Column(db.Integer, db.ForeignKey('tracked_account.id'), nullable=False)
+    channel_id = db.Column(db.Integer, db.ForeignKey('channel.id'), nullable=False)
     
     date = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -109,8 +257,122 @@ class AnalyticsHistory(db.Model):
     followers = db.Column(db.Integer) # Для Insta
     subscribers = db.Column(db.Integer) # Для TG
     er = db.Column(db.Float)
-    
-    # ... тут можна додати avg_views, posts_per_day тощо, якщо потрібно
+    # Решта метрик знімка: перегляди - цілі, частоти - REAL (4 байти замість 8)
+    avg_views = db.Column(db.Integer)
+    posts_per_day = db.Column(db.REAL)
+    reaction_rate = db.Column(db.REAL)
+    min_views = db.Column(db.Integer)
+    max_views = db.Column(db.Integer)
+
+    # Графіки та дашборд читають історію каналу за діапазоном дат; один знімок каналу на момент часу
+    __table_args__ = (db.Index('uq_channel_history_channel_date', 'channel_id', 'date', unique=True),)
+
+    @staticmethod
+    def snapshot_row(channel_id, data, date=None):
+        """Колонки знімка з результату get_telegram_data (для add() або bulk_insert_mappings)."""
+        row = {'channel_id': channel_id, 'date': date or datetime.utcnow()}
+        for metric in SNAPSHOT_METRICS:
+            value = data.get(metric)
+            if metric == 'er' and value is None:
+                value = 0
+            if value is not None:
+                value = int(round(value)) if metric in _INTEGER_METRICS else round(float(value), 4)
+            row[metric] = value
+        return row
+
+    def __repr__(self):
+        return f'<History {self.channel.key} on {self.date.strftime("%Y-%m-%d")}>'
+
+# --- НОВА ТАБЛИЦЯ ---
+class AnalyticsRollup(db.Model):
+    """
+    Агрегат історії за день або тиждень (див. services/history_rollup.py).
+    Старі "сирі" знімки згортаються сюди, щоб AnalyticsHistory не ріс безмежно.
+    """
+    __tablename__ = 'channel_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel_id = db.Column(db.Integer, db.ForeignKey('channel.id'), nullable=False)
+    period = db.Column(db.String(10), nullable=False)  # 'day' or 'week'
+    period_start = db.Column(db.DateTime, nullable=False)
+    points = db.Column(db.Integer, nullable=False, default=0)  # скільки знімків агреговано
+    last_date = db.Column(db.DateTime, nullable=False)  # дата останнього знімка періоду
+
+    subscribers_min = db.Column(db.Integer)
+    subscribers_max = db.Column(db.Integer)
+    subscribers_last = db.Column(db.Integer)
+    subscribers_avg = db.Column(db.Float)
+    er_min = db.Column(db.Float)
+    er_max = db.Column(db.Float)
+    er_last = db.Column(db.Float)
+    er_avg = db.Column(db.Float)
+    avg_views_min = db.Column(db.Integer)
+    avg_views_max = db.Column(db.Integer)
+    avg_views_last = db.Column(db.Integer)
+    avg_views_avg = db.Column(db.REAL)
+    posts_per_day_min = db.Column(db.REAL)
+    posts_per_day_max = db.Column(db.REAL)
+    posts_per_day_last = db.Column(db.REAL)
+    posts_per_day_avg = db.Column(db.REAL)
+    reaction_rate_min = db.Column(db.REAL)
+    reaction_rate_max = db.Column(db.REAL)
+    reaction_rate_last = db.Column(db.REAL)
+    reaction_rate_avg = db.Column(db.REAL)
+    min_views_min = db.Column(db.Integer)
+    min_views_max = db.Column(db.Integer)
+    min_views_last = db.Column(db.Integer)
+    min_views_avg = db.Column(db.REAL)
+    max_views_min = db.Column(db.Integer)
+    max_views_max = db.Column(db.Integer)
+    max_views_last = db.Column(db.Integer)
+    max_views_avg = db.Column(db.REAL)
+
+    # Унікальність періоду + індекс для читання діапазону
+    __table_args__ = (db.UniqueConstraint('channel_id', 'period', 'period_start', name='_channel_rollup_uc'),)
 
     def __repr__(self):
-        return f'<History {self.account.username} on {self.date.strftime("%Y-%m-%d")}>'
\ No newline at end of file
+        return f'<Rollup {self.channel_id} {self.period} {self.period_start.strftime("%Y-%m-%d")}>'
+
+# --- ПЕРЕХІД НА КАНОНІЧНІ КАНАЛИ ---
+
+def _backfill_channels():
+    """
+    Кожен TrackedAccount без channel_id прив'язується до канонічного Channel,
+    а історія зі старої таблиці analytics_history (копія на кожного користувача)
+    одноразово переноситься в channel_history - по одному ряду на канал і момент
+    часу. Стара таблиця не видаляється.
+    """
+    orphans = TrackedAccount.query.filter(TrackedAccount.channel_id.is_(None)).all()
+    for account in orphans:
+        channel = Channel.get_or_create(account.platform, account.url, account.username, account.account_name)
+        channel.last_updated = max(channel.last_updated or datetime(2000, 1, 1),
+                                   account.last_updated or datetime(2000, 1, 1))
+        account.channel = channel
+    if orphans:
+        db.session.commit()
+        print(f"Прив'язано до каналів акаунтів: {len(orphans)}")
+
+    inspector = db.inspect(db.engine)
+    _copy_legacy_history(inspector)
+
+def _copy_legacy_history(inspector):
+    if 'analytics_history' not in inspector.get_table_names() or AnalyticsHistory.query.first() is not None:
+        return
+    legacy_columns = {column['name'] for column in inspector.get_columns('analytics_history')}
+    # Стара таблиця мала лише частину метрик знімка
+    metrics = [name for name in ('followers', *SNAPSHOT_METRICS) if name in legacy_columns]
+    columns = ['channel_id', 'date', *metrics]
+    # Знімки різних користувачів одного каналу в один момент - однакові, лишаємо один
+    aggregates = ', '.join(f'MAX(l.{name}) AS {name}' for name in metrics)
+    # NOT EXISTS - повторний запуск (напр. після збою посередині) не дублює вже перенесені ряди
+    result = db.session.execute(db.text(
+        f"INSERT INTO channel_history ({', '.join(columns)}) "
+        f"SELECT {', '.join(f'g.{name}' for name in columns)} FROM ("
+        f"SELECT a.channel_id AS channel_id, l.date AS date, {aggregates} "
+        f"FROM analytics_history l JOIN tracked_account a ON a.id = l.tracked_account_id "
+        f"WHERE a.channel_id IS NOT NULL GROUP BY a.channel_id, l.date"
+        f") g WHERE NOT EXISTS (SELECT 1 FROM channel_history t WHERE t.channel_id = g.channel_id AND t.date = g.date)"
+    ))
+    db.session.commit()
+    if result.rowcount:
+        print(f"Перенесено {result.rowcount} записів з analytics_history у channel_history")
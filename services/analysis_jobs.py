@@ -0,0 +1,145 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.cache_backend import SQLiteCache
+from services.single_flight import file_lock
+from services.telegram_parser import get_telegram_data, get_telegram_data_deep
+from services.telegram_errors import TelegramFetchError
+from utils import normalize_channel_url
+
+# --- Налаштування фонових аналізів ---
+# /analyze ставить задачу в чергу і одразу віддає сторінку статусу,
+# тож воркер gunicorn не чекає на Telegram
+ANALYZE_ASYNC = os.environ.get('ANALYZE_ASYNC', 'true').lower() in ['true', 'on', '1']
+_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 4))
+_JOB_QUEUE_LIMIT = int(os.environ.get('ANALYSIS_JOB_QUEUE_LIMIT', 50))
+JOB_TIMEOUT_SECONDS = int(os.environ.get('ANALYSIS_JOB_TIMEOUT_SECONDS', 120))
+_JOB_TTL_SECONDS = 60 * 60  # скільки зберігається результат задачі
+
+# Статуси задачі
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+
+# Спільне сховище задач: сторінку статусу може обслуговувати будь-який воркер
+_jobs = SQLiteCache('analysis_jobs')
+_ACTIVE_KEY_PREFIX = 'active:'
+# Стан задачі оновлюють потік задачі та сторінка статусу (будь-який воркер) - read-modify-write під файловим lock
+_JOBS_LOCK_NAME = 'analysis_jobs'
+
+_executor = None
+_executor_pid = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Пул потоків поточного процесу (після fork кожен воркер створює власний)."""
+    global _executor, _executor_pid, _pending
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=_JOB_WORKERS, thread_name_prefix='analysis-job')
+        _executor_pid = os.getpid()
+        _pending = 0
+    return _executor
+
+
+def _dedup_key(channel_url: str, is_pro_user: bool, deep: bool) -> str:
+    return f"{_ACTIVE_KEY_PREFIX}{normalize_channel_url(channel_url)}_{is_pro_user}_{deep}"
+
+
+def _save(job: dict):
+    _jobs.set(job['id'], job, ttl=_JOB_TTL_SECONDS)
+
+
+def _update(job_id: str, **fields):
+    with file_lock(_JOBS_LOCK_NAME):
+        cached = _jobs.get(job_id)
+        if cached is None:
+            return
+        job = cached[1]
+        if job['status'] in (DONE, ERROR):
+            return  # задача вже завершена (напр. за таймаутом) - пізній результат ігноруємо
+        job.update(fields)
+        _save(job)
+
+
+def get_analysis_job(job_id: str) -> dict | None:
+    """Стан задачі; задача, що виконується довше за таймаут, позначається як помилка."""
+    cached = _jobs.get(job_id)
+    if cached is None:
+        return None
+    job = cached[1]
+    if job['status'] in (QUEUED, RUNNING) and time.time() - job['created_at'] > JOB_TIMEOUT_SECONDS:
+        _update(job_id, status=ERROR, error_kind='timeout', finished_at=time.time(),
+                error="Аналіз триває надто довго. Спробуйте ще раз пізніше.")
+        job = _jobs.get(job_id)[1]
+    return job
+
+
+def submit_analysis_job(channel_url: str, is_pro_user: bool, deep: bool = False) -> tuple:
+    """
+    Ставить аналіз каналу в чергу. Повертає (job_id, None) або (None, помилка).
+    Якщо такий самий аналіз уже виконується, повертає id наявної задачі.
+    """
+    global _pending
+    dedup_key = _dedup_key(channel_url, is_pro_user, deep)
+    active = _jobs.get(dedup_key)
+    if active is not None:
+        job = get_analysis_job(active[1])
+        if job is not None and job['status'] in (QUEUED, RUNNING):
+            print(f"[JOBS] Приєднуюсь до наявної задачі {job['id']} для {channel_url}")
+            return job['id'], None
+
+    with _lock:
+        executor = _get_executor()
+        if _pending >= _JOB_QUEUE_LIMIT:
+            print(f"[JOBS] Черга аналізів переповнена ({_pending}), відхиляю {channel_url}")
+            return None, "Сервіс зараз перевантажений. Спробуйте за хвилину."
+        _pending += 1
+
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': QUEUED,
+        'url': channel_url,
+        'is_pro': is_pro_user,
+        'deep': deep,
+        'created_at': time.time(),
+        'progress': None,
+        'data': None,
+        'error': None,
+        'error_kind': None,
+    }
+    _save(job)
+    _jobs.set(dedup_key, job['id'], ttl=JOB_TIMEOUT_SECONDS)
+    executor.submit(_run_job, job['id'], dedup_key, channel_url, is_pro_user, deep)
+    print(f"[JOBS] Задача {job['id']} поставлена в чергу для {channel_url}")
+    return job['id'], None
+
+
+def _run_job(job_id: str, dedup_key: str, channel_url: str, is_pro_user: bool, deep: bool):
+    global _pending
+    try:
+        _update(job_id, status=RUNNING, started_at=time.time())
+        if deep:
+            data = get_telegram_data_deep(
+                channel_url, raise_errors=True,
+                progress_callback=lambda processed, total: _update(
+                    job_id, progress={'processed': processed, 'total': total})
+            )
+        else:
+            data = get_telegram_data(channel_url, is_pro_user=is_pro_user, raise_errors=True)
+        _update(job_id, status=DONE, data=data, finished_at=time.time())
+    except TelegramFetchError as e:
+        _update(job_id, status=ERROR, error=e.user_message, error_kind=e.kind, finished_at=time.time())
+    except Exception as e:
+        print(f"[JOBS] Помилка задачі {job_id}: {e}")
+        _update(job_id, status=ERROR, error=f"Сталася внутрішня помилка: {e}", finished_at=time.time())
+    finally:
+        active = _jobs.get(dedup_key)
+        if active is not None and active[1] == job_id:
+            _jobs.delete(dedup_key)
+        with _lock:
+            _pending -= 1
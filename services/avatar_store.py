@@ -0,0 +1,103 @@
+import os
+import glob
+import uuid
+import threading
+from telethon.tl.types import ChatPhoto
+
+# --- Налаштування сховища аватарок ---
+# Файл іменується за id каналу та id фото Telegram, тож повторно
+# завантажується лише тоді, коли канал змінив аватарку.
+AVATAR_DIR = os.path.join(os.path.dirname(__file__), '..', 'static', 'avatars')
+AVATAR_STATIC_PREFIX = 'avatars'
+AVATAR_MAX_BYTES = int(os.environ.get('AVATAR_STORE_MAX_BYTES', 50 * 1024 * 1024))  # 50 МБ
+
+os.makedirs(AVATAR_DIR, exist_ok=True)
+
+_evict_lock = threading.Lock()
+
+
+def _avatar_filename(channel_id: int, photo_id: int) -> str:
+    return f"{channel_id}_{photo_id}.jpg"
+
+
+def avatar_static_file(avatar_path: str | None) -> str | None:
+    """Шлях відносно static/ для url_for('static', filename=...)."""
+    if not avatar_path:
+        return None
+    return f"{AVATAR_STATIC_PREFIX}/{os.path.basename(avatar_path)}"
+
+
+async def get_channel_avatar(client, entity) -> str | None:
+    """
+    Повертає стабільний шлях до аватарки каналу, завантажуючи її
+    лише якщо такого фото ще немає у сховищі.
+    """
+    photo = getattr(entity, 'photo', None)
+    if not isinstance(photo, ChatPhoto):
+        print(f"Канал {entity.title} не має фото профілю.")
+        return None
+
+    filename = _avatar_filename(entity.id, photo.photo_id)
+    path = os.path.join(AVATAR_DIR, filename)
+    if os.path.exists(path):
+        try:
+            os.utime(path)  # позначаємо як нещодавно використану (для LRU)
+        except OSError:
+            pass
+        return path
+
+    # Завантажуємо у тимчасовий файл і атомарно перейменовуємо,
+    # щоб паралельні воркери не бачили напівзаписаний файл
+    part_path = f"{path}.part-{uuid.uuid4().hex}"
+    try:
+        await client.download_profile_photo(entity, file=part_path)
+        if not os.path.exists(part_path):
+            print(f"Канал {entity.title} не має фото профілю.")
+            return None
+        os.replace(part_path, path)
+        print(f"Аватар успішно завантажено у: {path}")
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    _remove_previous_photos(entity.id, keep=filename)
+    _evict_over_budget(keep=filename)
+    return path
+
+
+def _remove_previous_photos(channel_id: int, keep: str):
+    for old_path in glob.glob(os.path.join(AVATAR_DIR, f"{channel_id}_*.jpg")):
+        if os.path.basename(old_path) != keep:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+def _evict_over_budget(keep: str = None):
+    """Видаляє найдавніше використані аватарки, поки сховище більше за бюджет."""
+    with _evict_lock:
+        entries = []
+        total = 0
+        with os.scandir(AVATAR_DIR) as it:
+            for entry in it:
+                if not entry.is_file() or not entry.name.endswith('.jpg'):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+                total += stat.st_size
+        if total <= AVATAR_MAX_BYTES:
+            return
+
+        entries.sort()
+        for _, size, path, name in entries:
+            if total <= AVATAR_MAX_BYTES:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                print(f"[AVATARS] Видалено з кешу аватарок: {name}")
+            except OSError:
+                pass
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+
+# --- Налаштування кешу ---
+# memory - LRU у межах процесу; sqlite - спільний файл для всіх воркерів на хості
+CACHE_BACKEND = os.environ.get('ANALYTICS_CACHE_BACKEND', 'memory').lower()
+CACHE_MAX_BYTES = int(os.environ.get('ANALYTICS_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # 32 МБ
+CACHE_PATH = os.environ.get(
+    'ANALYTICS_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'social_analytics_cache.sqlite3')
+)
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def _loads(payload: bytes):
+    return json.loads(payload.decode('utf-8'))
+
+
+class MemoryLRUCache:
+    """
+    LRU-кеш у пам'яті процесу з бюджетом у байтах.
+    Значення зберігаються серіалізованими (JSON), тож кожен get() повертає нову копію.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (stored_at, expires_at, payload)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Повертає (stored_at, data) або None, якщо запису немає чи він протух."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, expires_at, payload = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return stored_at, _loads(payload)
+
+    def set(self, key: str, data, ttl: float):
+        payload = _dumps(data)
+        if len(payload) > self.max_bytes:
+            print(f"[CACHE] Запис {key} ({len(payload)} Б) більший за бюджет кешу, пропускаю.")
+            return
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now, now + ttl, payload)
+            self._size += len(payload)
+            self._evict(now)
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        _, _, payload = self._entries.pop(key)
+        self._size -= len(payload)
+
+    def _evict(self, now: float):
+        # Спочатку прибираємо протухлі записи, потім найдавніше використані
+        expired = [k for k, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+            self.evictions += 1
+        while self._size > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class SQLiteCache:
+    """
+    Кеш у локальному SQLite-файлі, спільний для всіх воркерів gunicorn на хості.
+    namespace дозволяє тримати кілька незалежних кешів в одному файлі.
+    Лічильники hits/misses/evictions рахуються в межах процесу.
+    """
+
+    def __init__(self, namespace: str, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.namespace = namespace
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sets_since_purge = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        # Окреме з'єднання на потік та процес (після fork старе не використовуємо)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                ' namespace TEXT NOT NULL, key TEXT NOT NULL,'
+                ' stored_at REAL NOT NULL, expires_at REAL NOT NULL,'
+                ' payload BLOB NOT NULL, PRIMARY KEY (namespace, key))'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS ix_cache_entries_stored'
+                ' ON cache_entries (namespace, stored_at)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, attr: str, n: int = 1):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + n)
+
+    def get(self, key: str):
+        """Повертає (stored_at, data) або None, якщо запису немає чи він протух."""
+        row = self._conn().execute(
+            'SELECT stored_at, expires_at, payload FROM cache_entries WHERE namespace = ? AND key = ?',
+            (self.namespace, key)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            self._count('misses')
+            return None
+        self._count('hits')
+        return row[0], _loads(row[2])
+
+    def set(self, key: str, data, ttl: float):
+        payload = _dumps(data)
+        now = time.time()
+        self._conn().execute(
+            'INSERT OR REPLACE INTO cache_entries (namespace, key, stored_at, expires_at, payload)'
+            ' VALUES (?, ?, ?, ?, ?)',
+            (self.namespace, key, now, now + ttl, payload)
+        )
+        with self._lock:
+            self._sets_since_purge += 1
+            purge = self._sets_since_purge >= 50
+            if purge:
+                self._sets_since_purge = 0
+        if purge:
+            self.purge()
+
+    def delete(self, key: str):
+        self._conn().execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, key)
+        )
+
+    def purge(self):
+        """Видаляє протухлі записи та найстаріші, якщо перевищено бюджет."""
+        conn = self._conn()
+        removed = conn.execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?',
+            (self.namespace, time.time())
+        ).rowcount
+        total = conn.execute(
+            'SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM cache_entries WHERE namespace = ?',
+            (self.namespace,)
+        ).fetchone()[0]
+        if total > self.max_bytes:
+            rows = conn.execute(
+                'SELECT key, LENGTH(payload) FROM cache_entries WHERE namespace = ? ORDER BY stored_at ASC',
+                (self.namespace,)
+            ).fetchall()
+            stale_keys = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                stale_keys.append((self.namespace, key))
+                total -= size
+            conn.executemany('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', stale_keys)
+            removed += len(stale_keys)
+        if removed:
+            self._count('evictions', removed)
+
+    def stats(self) -> dict:
+        entries, size = self._conn().execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM cache_entries WHERE namespace = ?',
+            (self.namespace,)
+        ).fetchone()
+        with self._lock:
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def create_cache_backend(namespace: str, backend: str = None, max_bytes: int = None):
+    """Створює бекенд кешу згідно з ANALYTICS_CACHE_BACKEND (memory | sqlite)."""
+    backend = (backend or CACHE_BACKEND).lower()
+    max_bytes = max_bytes or CACHE_MAX_BYTES
+    if backend == 'sqlite':
+        return SQLiteCache(namespace, max_bytes=max_bytes)
+    if backend != 'memory':
+        print(f"ПОПЕРЕДЖЕННЯ: Невідомий бекенд кешу '{backend}', використовую memory.")
+    return MemoryLRUCache(max_bytes=max_bytes)
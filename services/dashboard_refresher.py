@@ -0,0 +1,151 @@
+import os
+import time
+import random
+import threading
+from datetime import datetime, timedelta
+from services.single_flight import LOCK_DIR, fcntl
+from services.telegram_parser import get_telegram_data_many
+from services.request_scheduler import LANE_BACKGROUND
+from services.history_rollup import rollup_history, ROLLUP_INTERVAL_SECONDS
+from services.pdf_pool import is_pool_process
+from models import db, Channel, TrackedAccount, AnalyticsHistory
+
+# --- Налаштування планового оновлення дашборду ---
+# Кожен відстежуваний канал оновлюється раз на REFRESH_INTERVAL; канал,
+# який відстежують сотні користувачів, отримується та зберігається лише один раз
+REFRESH_ENABLED = os.environ.get('DASHBOARD_REFRESH_ENABLED', 'true').lower() in ['true', 'on', '1']
+REFRESH_INTERVAL_SECONDS = int(os.environ.get('DASHBOARD_REFRESH_INTERVAL_SECONDS', 6 * 60 * 60))
+# Як часто планувальник прокидається, щоб знайти "прострочені" акаунти
+_TICK_SECONDS = int(os.environ.get('DASHBOARD_REFRESH_TICK_SECONDS', 300))
+# Випадкова затримка перед кожним проходом, щоб воркери / інстанси не стартували разом
+_JITTER_SECONDS = int(os.environ.get('DASHBOARD_REFRESH_JITTER_SECONDS', 60))
+# Скільки каналів в одному пакетному запиті та одночасно на клієнті
+_BATCH_SIZE = int(os.environ.get('DASHBOARD_REFRESH_BATCH_SIZE', 50))
+_CONCURRENCY = int(os.environ.get('DASHBOARD_REFRESH_CONCURRENCY', 3))
+
+# Лише один воркер gunicorn виконує оновлення: той, хто тримає файловий lock.
+# Lock звільняється ОС, коли процес завершується, і його перехоплює інший воркер.
+_LEADER_LOCK_PATH = os.path.join(LOCK_DIR, 'dashboard_refresher.lock')
+
+_thread = None
+_thread_pid = None
+_leader_file = None
+_last_rollup_at = None
+_stop_event = threading.Event()
+
+
+def _try_become_leader() -> bool:
+    global _leader_file
+    if _leader_file is not None:
+        return True
+    if fcntl is None:
+        return True  # без fcntl (Windows) - один процес розробки
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    lock_file = open(_LEADER_LOCK_PATH, 'a')
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _leader_file = lock_file
+    print(f"[DASHBOARD REFRESH] Воркер PID {os.getpid()} виконує планові оновлення")
+    return True
+
+
+def _due_channels() -> list:
+    """Telegram-канали з хоча б одним підписником, яким час оновитись."""
+    cutoff = datetime.utcnow() - timedelta(seconds=REFRESH_INTERVAL_SECONDS)
+    has_subscribers = db.exists().where(TrackedAccount.channel_id == Channel.id)
+    return Channel.query.filter(
+        Channel.platform == 'telegram',
+        Channel.last_updated <= cutoff,
+        has_subscribers
+    ).order_by(Channel.last_updated.asc()).all()
+
+
+def _refresh_batch(channels: list) -> int:
+    """Отримує пакет каналів і записує по одному знімку на канал. Повертає кількість оновлених."""
+    results = get_telegram_data_many([channel.url for channel in channels], is_pro_user=True, force_fresh=True,
+                                     concurrency=_CONCURRENCY, lane=LANE_BACKGROUND)
+    now = datetime.utcnow()
+    history_rows = []
+    for channel in channels:
+        data = results.get(channel.url, {}).get('data')
+        if data:
+            history_rows.append(AnalyticsHistory.snapshot_row(channel.id, data, date=now))
+
+    if history_rows:
+        db.session.bulk_insert_mappings(AnalyticsHistory, history_rows)
+        Channel.query.filter(Channel.id.in_([row['channel_id'] for row in history_rows])).update(
+            {Channel.last_updated: now}, synchronize_session=False
+        )
+    db.session.commit()
+    return len(history_rows)
+
+
+def refresh_due_accounts() -> dict:
+    """Один прохід планового оновлення (потребує контексту застосунку Flask)."""
+    started = time.time()
+    channels = _due_channels()
+    if not channels:
+        return {'channels': 0, 'refreshed_channels': 0, 'seconds': 0}
+
+    print(f"[DASHBOARD REFRESH] До оновлення: {len(channels)} каналів")
+    refreshed_channels = 0
+    for start in range(0, len(channels), _BATCH_SIZE):
+        if _stop_event.is_set():
+            break
+        try:
+            refreshed_channels += _refresh_batch(channels[start:start + _BATCH_SIZE])
+        except Exception as e:
+            db.session.rollback()
+            print(f"[DASHBOARD REFRESH] Помилка оновлення пакета: {e}")
+
+    seconds = round(time.time() - started, 1)
+    print(f"[DASHBOARD REFRESH] Оновлено {refreshed_channels}/{len(channels)} каналів, {seconds} с")
+    return {'channels': len(channels), 'refreshed_channels': refreshed_channels, 'seconds': seconds}
+
+
+def _maybe_rollup_history():
+    """Згортання старої історії - не частіше, ніж раз на ROLLUP_INTERVAL_SECONDS."""
+    global _last_rollup_at
+    if _last_rollup_at is not None and time.monotonic() - _last_rollup_at < ROLLUP_INTERVAL_SECONDS:
+        return
+    _last_rollup_at = time.monotonic()
+    rollup_history()
+
+
+def _run(app):
+    while not _stop_event.wait(random.uniform(0, _JITTER_SECONDS)):
+        if _try_become_leader():
+            with app.app_context():
+                try:
+                    refresh_due_accounts()
+                    _maybe_rollup_history()
+                except Exception as e:
+                    print(f"[DASHBOARD REFRESH] Помилка планового оновлення: {e}")
+                finally:
+                    db.session.remove()
+        if _stop_event.wait(_TICK_SECONDS):
+            break
+
+
+def start_dashboard_refresher(app):
+    """Запускає фоновий потік планового оновлення (по одному на процес; працює лише лідер)."""
+    global _thread, _thread_pid
+    if not REFRESH_ENABLED or is_pool_process():
+        return
+    if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(target=_run, args=(app,), name='dashboard-refresher', daemon=True)
+    _thread_pid = os.getpid()
+    _thread.start()
+
+
+def stop_dashboard_refresher():
+    global _leader_file
+    _stop_event.set()
+    if _leader_file is not None:
+        _leader_file.close()  # звільняє lock для інших воркерів
+        _leader_file = None
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from services.cache_backend import SQLiteCache
+
+# --- Налаштування індексу ---
+# Канонічний username -> (id, access_hash) каналу. Зберігається у спільному
+# SQLite-файлі, тож резолв username (resolveUsername, схильний до FloodWait)
+# робиться один раз для всіх воркерів на хості.
+ENTITY_INDEX_PATH = os.environ.get(
+    'ENTITY_INDEX_PATH',
+    os.path.join(tempfile.gettempdir(), 'social_analytics_entities.sqlite3')
+)
+# Після цього часу запис вважається застарілим і username резолвиться знову
+ENTITY_INDEX_TTL_SECONDS = int(os.environ.get('ENTITY_INDEX_TTL_SECONDS', 7 * 24 * 60 * 60))
+
+_index = SQLiteCache('entity_index', path=ENTITY_INDEX_PATH)
+
+
+def is_indexable(channel_key: str) -> bool:
+    """Індексуємо лише публічні username (не інвайт-посилання)."""
+    return bool(channel_key) and not channel_key.startswith('+') and not channel_key.startswith('joinchat/')
+
+
+def _index_key(channel_key: str, scope: str) -> str:
+    # access_hash прив'язаний до акаунта Telegram, тому ключ включає сесію
+    return f"{scope}:{channel_key}"
+
+
+def lookup_peer(channel_key: str, scope: str) -> tuple | None:
+    """Повертає (channel_id, access_hash) або None, якщо запису немає чи він застарів."""
+    if not is_indexable(channel_key):
+        return None
+    cached = _index.get(_index_key(channel_key, scope))
+    if cached is None:
+        return None
+    peer = cached[1]
+    return peer['id'], peer['access_hash']
+
+
+def remember_peer(channel_key: str, scope: str, channel_id: int, access_hash: int):
+    if not is_indexable(channel_key) or access_hash is None:
+        return
+    _index.set(
+        _index_key(channel_key, scope),
+        {'id': channel_id, 'access_hash': access_hash},
+        ttl=ENTITY_INDEX_TTL_SECONDS
+    )
+
+
+def invalidate_peer(channel_key: str, scope: str):
+    print(f"[ENTITY INDEX] Інвалідую запис для '{channel_key}'")
+    _index.delete(_index_key(channel_key, scope))
+
+
+def get_index_stats() -> dict:
+    return _index.stats()
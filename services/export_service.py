@@ -18,8 +18,9 @@ def generate_csv(data: dict) -> io.StringIO:
     writer.writerow(['Тип', data.get('type', 'N/A')])
     
     # 3. Метрики (тільки Telegram)
+    posts_analyzed = data.get('posts_analyzed') or 20
     writer.writerow(['Підписники', data.get('subscribers', 0)])
-    writer.writerow(['Сер. перегляди (20 постів)', data.get('avg_views', 0)])
+    writer.writerow([f'Сер. перегляди ({posts_analyzed} постів)', data.get('avg_views', 0)])
 
     # 4. Pro-метрики (якщо вони є у словнику)
     if 'er' in data:
@@ -28,8 +29,8 @@ def generate_csv(data: dict) -> io.StringIO:
         writer.writerow(['Частота постингу (пост/день)', f"{data.get('posts_per_day', 0):.1f}"])
         # --- НОВІ РЯДКИ ---
         writer.writerow(['Коефіцієнт Реакцій (RR)', f"{data.get('reaction_rate', 0):.2f}%"])
-        writer.writerow(['Мін. Перегляди (20 постів)', data.get('min_views', 0)])
-        writer.writerow(['Макс. Перегляди (20 постів)', data.get('max_views', 0)])
+        writer.writerow([f'Мін. Перегляди ({posts_analyzed} постів)', data.get('min_views', 0)])
+        writer.writerow([f'Макс. Перегляди ({posts_analyzed} постів)', data.get('max_views', 0)])
 
     # 5. Top/Flop пости
     if 'top_posts' in data:
@@ -0,0 +1,238 @@
+import io
+import os
+import time
+import zlib
+import random
+import asyncio
+from datetime import datetime, timezone
+from telethon.tl import types
+from telethon.tl.types import messages as messages_types
+from telethon.tl.functions.channels import GetFullChannelRequest
+from telethon.tl.functions.messages import GetMessagesViewsRequest, GetMessagesReactionsRequest
+from telethon.errors import FloodWaitError, ChannelPrivateError, ChannelInvalidError
+from utils import normalize_channel_url
+
+# --- Налаштування синтетичного бекенду ---
+# Середня затримка одного виклику API (експоненційний розподіл - з "хвостом")
+FAKE_LATENCY_MS = float(os.environ.get('TELEGRAM_FAKE_LATENCY_MS', 80))
+# Ймовірність FloodWait на кожен виклик та його тривалість
+FAKE_FLOOD_RATE = float(os.environ.get('TELEGRAM_FAKE_FLOOD_RATE', 0))
+FAKE_FLOOD_SECONDS = int(os.environ.get('TELEGRAM_FAKE_FLOOD_SECONDS', 30))
+
+# Спеціальні username для перевірки обробки збоїв
+_MISSING_PREFIX = 'missing'
+_PRIVATE_PREFIX = 'private'
+_HISTORY_PAGE_SIZE = 100  # стільки повідомлень Telegram віддає за один запит
+_REACTIONS = ('👍', '🔥', '❤', '😁')
+
+# id -> _FakeChannel (щоб GetFullChannelRequest(InputChannel) знаходив канал)
+_channels_by_id = {}
+
+
+async def simulate_network(rng: random.Random, latency_ms: float = FAKE_LATENCY_MS,
+                           flood_rate: float = 0.0, flood_seconds: int = FAKE_FLOOD_SECONDS):
+    """Затримка мережі та (з ймовірністю flood_rate) FloodWait."""
+    if latency_ms > 0:
+        await asyncio.sleep(rng.expovariate(1000.0 / latency_ms))
+    if flood_rate > 0 and rng.random() < flood_rate:
+        raise FloodWaitError(request=None, capture=flood_seconds)
+
+
+class _FakeChannel:
+    """Детермінований канал: параметри та пости залежать лише від username."""
+
+    def __init__(self, username: str):
+        self.seed = zlib.crc32(username.encode('utf-8'))
+        rng = random.Random(self.seed)
+        self.username = username
+        self.id = self.id_for(username)
+        self.access_hash = (self.seed * 2_654_435_761) % (2 ** 62)
+        self.photo_id = self.seed
+        self.title = f"Test {username}"
+        self.subscribers = rng.randint(1_000, 500_000)
+        self.initial_posts = rng.randint(50, 3_000)
+        self.post_interval = rng.randint(30 * 60, 6 * 60 * 60)
+        self.reach = rng.uniform(0.05, 0.6)
+        self.reaction_share = rng.uniform(0.002, 0.03)
+        # Найновіший пост - "зараз"; далі нові пости з'являються з інтервалом post_interval
+        self.anchor = int(time.time())
+
+    @staticmethod
+    def id_for(username: str) -> int:
+        return 1_000_000_000 + zlib.crc32(username.encode('utf-8')) % 1_000_000_000
+
+    @property
+    def top_id(self) -> int:
+        return self.initial_posts + (int(time.time()) - self.anchor) // self.post_interval
+
+    def entity(self) -> types.Channel:
+        return types.Channel(
+            id=self.id, title=self.title, date=datetime.fromtimestamp(self.anchor, timezone.utc),
+            photo=types.ChatPhoto(photo_id=self.photo_id, dc_id=2),
+            broadcast=True, access_hash=self.access_hash, username=self.username,
+        )
+
+    def full_channel(self) -> messages_types.ChatFull:
+        return messages_types.ChatFull(
+            full_chat=types.ChannelFull(
+                id=self.id, about='', read_inbox_max_id=0, read_outbox_max_id=0, unread_count=0,
+                chat_photo=types.PhotoEmpty(id=0), notify_settings=types.PeerNotifySettings(),
+                bot_info=[], pts=1, participants_count=self.subscribers,
+            ),
+            chats=[self.entity()], users=[]
+        )
+
+    def _message_rng(self, msg_id: int) -> random.Random:
+        return random.Random(self.seed * 1_000_003 + msg_id)
+
+    def views(self, msg_id: int, top_id: int) -> int:
+        rng = self._message_rng(msg_id)
+        age = (top_id - msg_id) * self.post_interval
+        # Перегляди набираються протягом першої доби
+        maturity = min(1.0, (age + 3_600) / 86_400)
+        return max(1, int(self.subscribers * self.reach * rng.uniform(0.3, 1.7) * maturity))
+
+    def reactions(self, msg_id: int, views: int) -> types.MessageReactions:
+        rng = self._message_rng(msg_id)
+        rng.random()  # той самий потік, що й у views, але зсунутий
+        total = int(views * self.reaction_share * rng.uniform(0.5, 1.5))
+        results = []
+        for emoticon in _REACTIONS:
+            count = total // 2
+            total -= count
+            if count:
+                results.append(types.ReactionCount(reaction=types.ReactionEmoji(emoticon=emoticon), count=count))
+        return types.MessageReactions(results=results)
+
+    def message(self, msg_id: int, top_id: int) -> types.Message:
+        rng = self._message_rng(msg_id)
+        views = self.views(msg_id, top_id)
+        # Пости лише з медіа мають порожній текст (як у справжньому Telegram)
+        text = '' if rng.random() < 0.1 else f"Пост #{msg_id} каналу {self.title}\nТекст поста"
+        return types.Message(
+            id=msg_id,
+            peer_id=types.PeerChannel(channel_id=self.id),
+            date=datetime.fromtimestamp(self.anchor + (msg_id - self.initial_posts) * self.post_interval,
+                                        timezone.utc),
+            message=text,
+            post=True,
+            views=views,
+            forwards=max(1, views // 100),  # у TL views та forwards задаються разом
+            reactions=self.reactions(msg_id, views),
+        )
+
+
+def _channel_for(username: str) -> _FakeChannel:
+    channel = _channels_by_id.get(_FakeChannel.id_for(username))
+    if channel is None or channel.username != username:
+        channel = _FakeChannel(username)
+        _channels_by_id[channel.id] = channel
+    return channel
+
+
+class FakeTelegramClient:
+    """
+    Синтетичний бекенд Telegram для навантажувального тестування без мережі.
+    Реалізує ту частину API TelegramClient, яку використовують парсер та сховище
+    аватарок, і повертає справжні TL-типи Telethon.
+    Username 'missing...' - канал не існує, 'private...' - приватний канал.
+    """
+
+    def __init__(self, session_string: str = None, latency_ms: float = FAKE_LATENCY_MS,
+                 flood_rate: float = FAKE_FLOOD_RATE, flood_seconds: int = FAKE_FLOOD_SECONDS):
+        self.session_string = session_string
+        self.latency_ms = latency_ms
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self._rng = random.Random()
+        self._connected = False
+
+    async def _network(self):
+        await simulate_network(self._rng, self.latency_ms, self.flood_rate, self.flood_seconds)
+
+    # --- З'єднання ---
+
+    async def connect(self):
+        self._connected = True
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    async def disconnect(self):
+        self._connected = False
+
+    # --- API ---
+
+    def _resolve(self, entity) -> _FakeChannel:
+        channel_id = getattr(entity, 'channel_id', None) or getattr(entity, 'id', None)
+        channel = _channels_by_id.get(channel_id)
+        if channel is None:
+            raise ChannelInvalidError(request=None)
+        return channel
+
+    async def get_entity(self, channel_url: str) -> types.Channel:
+        await self._network()
+        key = normalize_channel_url(channel_url)
+        if not key or key.startswith(_MISSING_PREFIX):
+            raise ValueError(f'No user has "{key}" as username')
+        if key.startswith((_PRIVATE_PREFIX, '+', 'joinchat/')):
+            raise ChannelPrivateError(request=None)
+        return _channel_for(key).entity()
+
+    async def __call__(self, request):
+        await self._network()
+        if isinstance(request, GetFullChannelRequest):
+            return self._resolve(request.channel).full_channel()
+
+        channel = self._resolve(request.peer)
+        top_id = channel.top_id
+        if isinstance(request, GetMessagesViewsRequest):
+            return messages_types.MessageViews(
+                views=[types.MessageViews(views=channel.views(i, top_id) if 0 < i <= top_id else None)
+                       for i in request.id],
+                chats=[], users=[]
+            )
+        if isinstance(request, GetMessagesReactionsRequest):
+            updates = [
+                types.UpdateMessageReactions(
+                    peer=types.PeerChannel(channel_id=channel.id), msg_id=i,
+                    reactions=channel.reactions(i, channel.views(i, top_id))
+                )
+                for i in request.id if 0 < i <= top_id
+            ]
+            return types.Updates(updates=updates, users=[], chats=[],
+                                 date=datetime.now(timezone.utc), seq=0)
+        raise NotImplementedError(f"FakeTelegramClient не підтримує {type(request).__name__}")
+
+    async def get_messages(self, entity, limit: int = None, min_id: int = None) -> list:
+        await self._network()
+        channel = self._resolve(entity)
+        top_id = channel.top_id
+        lowest = max((min_id or 0) + 1, top_id - (limit or 1) + 1, 1)
+        return [channel.message(i, top_id) for i in range(top_id, lowest - 1, -1)]
+
+    async def iter_messages(self, entity, limit: int = None):
+        channel = self._resolve(entity)
+        top_id = channel.top_id
+        lowest = max(1, top_id - limit + 1) if limit else 1
+        for msg_id in range(top_id, lowest - 1, -1):
+            if (top_id - msg_id) % _HISTORY_PAGE_SIZE == 0:
+                await self._network()
+            yield channel.message(msg_id, top_id)
+
+    async def download_profile_photo(self, entity, file: str = None):
+        await self._network()
+        channel = self._resolve(entity)
+        try:
+            from PIL import Image  # встановлюється разом з reportlab
+        except ImportError:
+            return None
+        rng = random.Random(channel.seed)
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))).save(buffer, 'JPEG')
+        with open(file, 'wb') as f:
+            f.write(buffer.getvalue())
+        return file
@@ -0,0 +1,227 @@
+import os
+from datetime import datetime, timedelta
+from models import db, AnalyticsHistory, AnalyticsRollup, SNAPSHOT_METRICS
+
+# --- Налаштування зберігання історії ---
+# "Сирі" знімки старші за RAW_RETENTION_DAYS згортаються в денні агрегати,
+# денні старші за DAILY_RETENTION_DAYS - у тижневі; тижневі видаляються
+# після WEEKLY_RETENTION_DAYS (0 - зберігати завжди)
+RAW_RETENTION_DAYS = int(os.environ.get('HISTORY_RAW_RETENTION_DAYS', 30))
+DAILY_RETENTION_DAYS = int(os.environ.get('HISTORY_DAILY_RETENTION_DAYS', 365))
+WEEKLY_RETENTION_DAYS = int(os.environ.get('HISTORY_WEEKLY_RETENTION_DAYS', 0))
+# Як часто планувальник дашборду запускає згортання
+ROLLUP_INTERVAL_SECONDS = int(os.environ.get('HISTORY_ROLLUP_INTERVAL_SECONDS', 24 * 60 * 60))
+
+DAY = 'day'
+WEEK = 'week'
+
+# Метрики знімка, для яких зберігаються min / max / last / avg
+ROLLUP_METRICS = SNAPSHOT_METRICS
+
+_YIELD_PER = 1000
+
+
+def _period_start(moment: datetime, period: str) -> datetime:
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == WEEK:
+        return day - timedelta(days=day.weekday())  # тиждень починається з понеділка
+    return day
+
+
+class _Aggregate:
+    """Накопичує min / max / last / середнє метрик за один період."""
+
+    def __init__(self):
+        self.points = 0
+        self.last_date = None
+        self.stats = {metric: {'min': None, 'max': None, 'last': None, 'sum': 0.0, 'count': 0}
+                      for metric in ROLLUP_METRICS}
+
+    def _add(self, date: datetime, points: int, values: dict):
+        is_latest = self.last_date is None or date >= self.last_date
+        self.points += points
+        if is_latest:
+            self.last_date = date
+        for metric, (low, high, last, total, count) in values.items():
+            stats = self.stats[metric]
+            if not count:
+                continue
+            stats['min'] = low if stats['min'] is None else min(stats['min'], low)
+            stats['max'] = high if stats['max'] is None else max(stats['max'], high)
+            stats['sum'] += total
+            stats['count'] += count
+            if is_latest or stats['last'] is None:
+                stats['last'] = last
+
+    def add_point(self, date: datetime, point):
+        values = {}
+        for metric in ROLLUP_METRICS:
+            value = getattr(point, metric)
+            values[metric] = (value, value, value, value, 1) if value is not None else (None, None, None, 0, 0)
+        self._add(date, 1, values)
+
+    def add_rollup(self, rollup: AnalyticsRollup):
+        values = {}
+        for metric in ROLLUP_METRICS:
+            avg = getattr(rollup, f'{metric}_avg')
+            if avg is None:
+                values[metric] = (None, None, None, 0, 0)
+            else:
+                values[metric] = (getattr(rollup, f'{metric}_min'), getattr(rollup, f'{metric}_max'),
+                                  getattr(rollup, f'{metric}_last'), avg * rollup.points, rollup.points)
+        self._add(rollup.last_date, rollup.points, values)
+
+    def columns(self) -> dict:
+        columns = {'points': self.points, 'last_date': self.last_date}
+        for metric, stats in self.stats.items():
+            columns[f'{metric}_min'] = stats['min']
+            columns[f'{metric}_max'] = stats['max']
+            columns[f'{metric}_last'] = stats['last']
+            columns[f'{metric}_avg'] = stats['sum'] / stats['count'] if stats['count'] else None
+        return columns
+
+
+def _save_rollups(period: str, aggregates: dict):
+    """Записує агрегати {(channel_id, period_start): _Aggregate}, зливаючи з наявними."""
+    if not aggregates:
+        return
+    channel_ids = {channel_id for channel_id, _ in aggregates}
+    existing = AnalyticsRollup.query.filter(
+        AnalyticsRollup.channel_id.in_(channel_ids),
+        AnalyticsRollup.period == period,
+        AnalyticsRollup.period_start.in_({start for _, start in aggregates})
+    ).all()
+    for rollup in existing:
+        aggregate = aggregates.get((rollup.channel_id, rollup.period_start))
+        if aggregate is None:
+            continue
+        aggregate.add_rollup(rollup)
+        for column, value in aggregate.columns().items():
+            setattr(rollup, column, value)
+        del aggregates[(rollup.channel_id, rollup.period_start)]
+
+    db.session.bulk_insert_mappings(AnalyticsRollup, [
+        {'channel_id': channel_id, 'period': period, 'period_start': start, **aggregate.columns()}
+        for (channel_id, start), aggregate in aggregates.items()
+    ])
+
+
+def _roll_raw_into_days(cutoff: datetime) -> int:
+    query = AnalyticsHistory.query.filter(AnalyticsHistory.date < cutoff)
+    aggregates = {}
+    rows = 0
+    for point in query.order_by(AnalyticsHistory.channel_id, AnalyticsHistory.date).yield_per(_YIELD_PER):
+        key = (point.channel_id, _period_start(point.date, DAY))
+        aggregates.setdefault(key, _Aggregate()).add_point(point.date, point)
+        rows += 1
+    _save_rollups(DAY, aggregates)
+    query.delete(synchronize_session=False)
+    return rows
+
+
+def _roll_days_into_weeks(cutoff: datetime) -> int:
+    query = AnalyticsRollup.query.filter(AnalyticsRollup.period == DAY, AnalyticsRollup.period_start < cutoff)
+    aggregates = {}
+    rows = 0
+    for rollup in query.yield_per(_YIELD_PER):
+        key = (rollup.channel_id, _period_start(rollup.period_start, WEEK))
+        aggregates.setdefault(key, _Aggregate()).add_rollup(rollup)
+        rows += 1
+    _save_rollups(WEEK, aggregates)
+    query.delete(synchronize_session=False)
+    return rows
+
+
+def rollup_history(now: datetime = None) -> dict:
+    """
+    Згортає стару історію та застосовує політику зберігання
+    (потребує контексту застосунку Flask). Межі вирівняні на початок
+    дня / тижня, тож у агрегат потрапляють лише завершені періоди.
+    """
+    now = now or datetime.utcnow()
+    raw_cutoff = _period_start(now - timedelta(days=RAW_RETENTION_DAYS), DAY)
+    daily_cutoff = _period_start(now - timedelta(days=DAILY_RETENTION_DAYS), WEEK)
+    try:
+        raw_rows = _roll_raw_into_days(raw_cutoff)
+        day_rows = _roll_days_into_weeks(daily_cutoff)
+        expired = 0
+        if WEEKLY_RETENTION_DAYS > 0:
+            expired = AnalyticsRollup.query.filter(
+                AnalyticsRollup.period == WEEK,
+                AnalyticsRollup.period_start < now - timedelta(days=WEEKLY_RETENTION_DAYS)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    print(f"[HISTORY ROLLUP] Знімків -> дні: {raw_rows}, дні -> тижні: {day_rows}, видалено тижнів: {expired}")
+    return {'raw_rolled': raw_rows, 'days_rolled': day_rows, 'weeks_expired': expired}
+
+
+# --- ЧИТАННЯ ІСТОРІЇ ---
+
+class HistoryPoint:
+    """Точка історії з агрегату: ті самі атрибути, що й у AnalyticsHistory."""
+
+    def __init__(self, date: datetime, **metrics):
+        self.date = date
+        self.followers = None
+        for metric in ROLLUP_METRICS:
+            setattr(self, metric, metrics.get(metric))
+
+
+def get_history_points(channel_id: int, days: int, now: datetime = None) -> list:
+    """
+    Історія каналу за останні N днів з найвідповіднішого джерела:
+    у межах RAW_RETENTION_DAYS - "сирі" знімки, інакше - одна точка на день
+    (або на тиждень для діапазонів, довших за DAILY_RETENTION_DAYS)
+    з останніми значеннями періоду.
+    """
+    now = now or datetime.utcnow()
+    start = now - timedelta(days=days)
+    raw_query = AnalyticsHistory.query.filter(
+        AnalyticsHistory.channel_id == channel_id,
+        AnalyticsHistory.date >= start
+    ).order_by(AnalyticsHistory.date.asc())
+    if days <= RAW_RETENTION_DAYS:
+        return raw_query.all()
+
+    resolution = DAY if days <= DAILY_RETENTION_DAYS else WEEK
+    # (дата, значення) з усіх рівнів; для кожного періоду лишаємо найсвіжіше
+    latest = {}
+
+    def consider(date, values):
+        bucket = _period_start(date, resolution)
+        current = latest.get(bucket)
+        if current is None or date >= current[0]:
+            latest[bucket] = (date, values)
+
+    rollups = AnalyticsRollup.query.filter(
+        AnalyticsRollup.channel_id == channel_id,
+        AnalyticsRollup.period_start >= _period_start(start, WEEK)
+    )
+    for rollup in rollups:
+        if rollup.last_date >= start:
+            consider(rollup.last_date, {m: getattr(rollup, f'{m}_last') for m in ROLLUP_METRICS})
+    for point in raw_query:
+        consider(point.date, {m: getattr(point, m) for m in ROLLUP_METRICS})
+
+    return [HistoryPoint(bucket, **values) for bucket, (_, values) in sorted(latest.items())]
+
+
+def get_history_points_many(channel_ids: list, days: int, now: datetime = None) -> dict:
+    """
+    get_history_points для кількох каналів: {channel_id: [точки]}.
+    У межах RAW_RETENTION_DAYS - одним запитом на всю сторінку каналів.
+    """
+    if days > RAW_RETENTION_DAYS:
+        return {channel_id: get_history_points(channel_id, days, now) for channel_id in channel_ids}
+    start = (now or datetime.utcnow()) - timedelta(days=days)
+    points = {channel_id: [] for channel_id in channel_ids}
+    query = AnalyticsHistory.query.filter(
+        AnalyticsHistory.channel_id.in_(channel_ids),
+        AnalyticsHistory.date >= start
+    ).order_by(AnalyticsHistory.channel_id, AnalyticsHistory.date.asc())
+    for point in query:
+        points[point.channel_id].append(point)
+    return points
@@ -6,7 +6,7 @@ from reportlab.lib.units import inch, mm
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, KeepTogether, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, KeepTogether, Image, PageBreak
 from reportlab.pdfbase.pdfmetrics import registerFont
 from reportlab.pdfbase.ttfonts import TTFont
 
@@ -140,7 +140,7 @@ def _on_page(canvas, doc):
 def _create_metric_card(data: dict):
     p_title = Paragraph('ПІДПИСНИКИ:', styles['Card_Title_Small'])
     p_value = Paragraph(f"{data.get('subscribers', 0):,}", styles['Card_Value_Big'])
-    p_title2 = Paragraph('СЕР. ПЕРЕГЛЯДИ (20 ПОСТІВ):', styles['Card_Title_Small'])
+    p_title2 = Paragraph(f"СЕР. ПЕРЕГЛЯДИ ({data.get('posts_analyzed') or 20} ПОСТІВ):", styles['Card_Title_Small'])
     p_value2 = Paragraph(f"{data.get('avg_views', 0):,}", styles['Card_Value_Big'])
     table_data = [[p_title, p_title2], [p_value, p_value2]]
     table = Table(table_data, colWidths=[2.5*inch, 3.5*inch])
@@ -235,8 +235,8 @@ def _create_content_card(data: dict, platform: str, usable_width: float):
     ]))
     return table
 
-def _create_history_card(history: list, platform: str):
-    p_title = Paragraph("📈 Історія Зростання (Останні 7 днів)", styles['H2_White'])
+def _create_history_card(history: list, platform: str, days: int = 7):
+    p_title = Paragraph(f"📈 Історія Зростання (Останні {days} днів)", styles['H2_White'])
     table_data = [
         [
             Paragraph("Дата", styles['PostText']), 
@@ -306,11 +306,13 @@ def _create_insights_card(insights: list):
 
 # --- ГОЛОВНА ФУНКЦІЯ ГЕНЕРАЦІЇ ---
 
-def generate_pdf_report(data: dict, platform: str, history: list = None, avatar_path: str = None) -> io.BytesIO:
+def generate_pdf_report(data: dict, platform: str, history: list = None, avatar_path: str = None,
+                        output=None) -> io.BytesIO:
     """
     Генерує PDF-звіт, з аватаркою, порадами та стилем з фото.
+    output - шлях або файл для запису замість буфера в пам'яті.
     """
-    buffer = io.BytesIO()
+    buffer = output if output is not None else io.BytesIO()
     doc = SimpleDocTemplate(
         buffer, 
         pagesize=A4,
@@ -384,5 +386,110 @@ def generate_pdf_report(data: dict, platform: str, history: list = None, avatar_
     # Збираємо PDF
     doc.build(Story, onFirstPage=_on_page, onLaterPages=_on_page)
     
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    if output is None:
+        buffer.seek(0)
+    return buffer
+
+
+# --- ПОРТФЕЛЬНИЙ ЗВІТ (усі канали дашборду) ---
+
+class _StreamingDocTemplate(SimpleDocTemplate):
+    """
+    Документ, що бере флоуваблі наступного розділу з ітератора лише тоді,
+    коли попередні вже зверстані: у пам'яті один розділ замість усього звіту
+    (готові сторінки ReportLab тримає стиснутими до кінця збирання).
+    """
+
+    def __init__(self, output, sections, **kwargs):
+        super().__init__(output, **kwargs)
+        self._sections = sections
+        self._story = None
+
+    def build(self, flowables, *args, **kwargs):
+        self._story = flowables
+        super().build(flowables, *args, **kwargs)
+
+    def handle_flowable(self, flowables):
+        # handle_flowable викликається і для службових списків (дії початку сторінки) - доповнюємо лише сам звіт
+        if flowables is self._story and len(flowables) <= 1:
+            flowables.extend(next(self._sections, []))
+        super().handle_flowable(flowables)
+
+
+def _create_portfolio_summary_card(summary: dict):
+    p_title = Paragraph('КАНАЛІВ:', styles['Card_Title_Small'])
+    p_value = Paragraph(f"{summary.get('accounts', 0):,}", styles['Card_Value_Big'])
+    p_title2 = Paragraph('СУМАРНА АУДИТОРІЯ:', styles['Card_Title_Small'])
+    p_value2 = Paragraph(f"{summary.get('subscribers', 0):,}", styles['Card_Value_Big'])
+    p_title3 = Paragraph('СЕРЕДНІЙ ER:', styles['Card_Title_Small'])
+    p_value3 = Paragraph(f"{summary.get('avg_er', 0):.2f}%", styles['Card_Value_Big'])
+
+    table = Table([[p_title, p_title2, p_title3], [p_value, p_value2, p_value3]],
+                  colWidths=[1.6*inch, 2.6*inch, 1.8*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,-1), COLOR_CARD),
+        ('PADDING', (0,0), (-1,-1), 12),
+        ('ROUNDEDCORNERS', [8, 8, 8, 8]),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ]))
+    return table
+
+
+def _portfolio_account_section(account: dict, history_days: int) -> list:
+    """Розділ одного каналу: шапка, метрики останнього знімка, поради та історія."""
+    data = account.get('data')
+    section = [
+        PageBreak(),
+        Paragraph((account.get('name') or 'N/A').upper(), styles['H1_White']),
+        Paragraph(f"@{account.get('username', 'N/A')} - {account.get('snapshot_label', 'знімків ще немає')}",
+                  styles['H1_Sub']),
+        Spacer(1, 0.15 * inch),
+    ]
+    if not data:
+        section.append(Paragraph("Для цього каналу ще немає збережених знімків. Оновіть його на Дашборді.",
+                                 styles['Base_White']))
+        return section
+
+    section += [_create_metric_card(data), Spacer(1, 0.15 * inch),
+                _create_pro_metrics_card(data), Spacer(1, 0.15 * inch)]
+    if data.get('insights'):
+        section += [_create_insights_card(data['insights']), Spacer(1, 0.15 * inch)]
+    if account.get('history'):
+        section.append(_create_history_card(account['history'], 'telegram', days=history_days))
+    return section
+
+
+def generate_portfolio_report(accounts, output, summary: dict, history_days: int = 7,
+                              progress_callback=None):
+    """
+    Генерує один PDF з усіма каналами дашборду у файл output.
+    accounts - ітератор словників {'name', 'username', 'snapshot_label', 'data', 'history'};
+    він читається по одному каналу під час верстки, а не збирається у список заздалегідь.
+    progress_callback(зверстано_каналів) викликається перед кожним наступним розділом.
+    """
+    def sections():
+        for index, account in enumerate(accounts):
+            if progress_callback:
+                progress_callback(index)
+            yield _portfolio_account_section(account, history_days)
+
+    doc = _StreamingDocTemplate(
+        output,
+        sections(),
+        pagesize=A4,
+        leftMargin=inch/2,
+        rightMargin=inch/2,
+        topMargin=inch/2,
+        bottomMargin=inch/2
+    )
+
+    Story = [
+        Paragraph("ПОРТФЕЛЬ КАНАЛІВ", styles['H1_White']),
+        Paragraph(f"Дані з останніх збережених знімків на {summary.get('generated_at', '')}", styles['H1_Sub']),
+        Spacer(1, 0.15 * inch),
+        _create_portfolio_summary_card(summary),
+    ]
+    doc.build(Story, onFirstPage=_on_page, onLaterPages=_on_page)
+    if progress_callback:
+        progress_callback(summary.get('accounts', 0))
+    return output
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import queue
+import threading
+import multiprocessing
+from types import SimpleNamespace
+from datetime import datetime
+from services.cache_backend import SQLiteCache
+
+# --- Налаштування пулу рендерингу PDF ---
+# ReportLab (doc.build) - CPU-bound і тримає GIL, тож рендеримо в окремих процесах,
+# щоб важкі звіти не гальмували інші запити воркера. 0 - рендерити в потоці запиту.
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_TIMEOUT_SECONDS = int(os.environ.get('PDF_RENDER_TIMEOUT_SECONDS', 30))
+# Скільки рендерів може виконуватись або чекати одночасно (на процес gunicorn)
+_QUEUE_LIMIT = int(os.environ.get('PDF_RENDER_QUEUE_LIMIT', 8))
+# Піднімати процеси пулу одразу при старті, а не на першому PDF
+_PREWARM = os.environ.get('PDF_RENDER_PREWARM', 'true').lower() in ['true', 'on', '1']
+# Окремі процеси для портфельних звітів: довгий рендер не займає слоти /download-pdf,
+# а таймаут інтерактивного рендера не зачіпає портфельний. 0 - рендерити в потоці задачі.
+PORTFOLIO_RENDER_WORKERS = int(os.environ.get('PORTFOLIO_RENDER_WORKERS', 1))
+
+# Прогрес довгих рендерів: пише процес пулу, читає сторінка статусу (будь-який воркер)
+_progress = SQLiteCache('pdf_render_progress')
+_PROGRESS_TTL_SECONDS = 60 * 60
+
+# Пули поточного процесу: 'interactive' (render_pdf) та 'portfolio' (render_portfolio_pdf)
+_pools = {}
+_pools_pid = None
+_in_flight = 0
+_lock = threading.Lock()
+
+
+class PdfRenderBusyError(RuntimeError):
+    """Черга рендерингу переповнена."""
+
+
+class PdfRenderTimeoutError(TimeoutError):
+    """Рендеринг не вклався в PDF_RENDER_TIMEOUT_SECONDS."""
+
+
+class PdfRenderError(RuntimeError):
+    """Рендер упав у процесі пулу (або процес завершився аварійно)."""
+
+
+# --- Код процесів пулу ---
+
+def _worker_main(conn):
+    """
+    Цикл процесу пулу: отримує (функція, аргументи) і відправляє (ok, результат).
+    Шрифти DejaVuSans та get_pdf_styles() завантажуються один раз - при імпорті.
+    """
+    import services.pdf_generator  # noqa: F401
+    while True:
+        try:
+            func, args = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+def is_pool_process() -> bool:
+    """
+    Чи це процес пулу. При запуску через `python app.py` spawn імпортує app.py
+    і в дочірньому процесі - фонові задачі там запускати не можна.
+    """
+    # Ім'я процесу встановлюється ще до імпорту головного модуля, parent_process() - пізніше
+    return multiprocessing.current_process().name != 'MainProcess'
+
+
+def _render(data: dict, platform: str, history: list, avatar_path: str, output_path: str):
+    from services.pdf_generator import generate_pdf_report
+    history = [SimpleNamespace(**point) for point in history] if history else None
+    if output_path:
+        generate_pdf_report(data, platform, history=history, avatar_path=avatar_path, output=output_path)
+        return output_path
+    return generate_pdf_report(data, platform, history=history, avatar_path=avatar_path).getvalue()
+
+
+def _report_progress(progress_key: str, rendered: int, total: int):
+    _progress.set(progress_key, {'rendered': rendered, 'total': total}, ttl=_PROGRESS_TTL_SECONDS)
+
+
+def _read_accounts(source):
+    """Канали з JSONL-файлу по одному рядку (дати історії - у форматі ISO)."""
+    for line in source:
+        account = json.loads(line)
+        account['history'] = [SimpleNamespace(**dict(point, date=datetime.fromisoformat(point['date'])))
+                              for point in account.get('history') or []]
+        yield account
+
+
+def _render_portfolio(source_path: str, output_path: str, summary: dict, history_days: int, progress_key: str):
+    from services.pdf_generator import generate_portfolio_report
+    total = summary.get('accounts', 0)
+    with open(source_path, encoding='utf-8') as source:
+        generate_portfolio_report(
+            _read_accounts(source), output_path, summary, history_days=history_days,
+            progress_callback=lambda rendered: _report_progress(progress_key, rendered, total)
+        )
+    return output_path
+
+
+# --- Пул ---
+# Кожен процес має власний канал зв'язку та виконує один рендер за раз, тож
+# завислий рендер зупиняється разом лише зі своїм процесом, а рендери інших
+# користувачів на сусідніх процесах не перериваються.
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), name='pdf-render', daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def run(self, func, args: tuple, timeout: float):
+        """Результат рендера; TimeoutError - не вклався, EOFError - процес завершився."""
+        self.conn.send((func, args))
+        if not self.conn.poll(max(timeout, 0)):
+            raise TimeoutError
+        ok, payload = self.conn.recv()
+        if not ok:
+            raise PdfRenderError(payload)
+        return payload
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class _RenderPool:
+    def __init__(self, size: int):
+        self.size = size
+        self.pid = os.getpid()
+        # spawn: дочірні процеси не успадковують потоки воркера (клієнти Telegram, планувальники)
+        self._context = multiprocessing.get_context('spawn')
+        self._idle = queue.LifoQueue()
+        self._workers = set()
+        self._lock = threading.Lock()
+
+    def _start_worker(self) -> _Worker | None:
+        with self._lock:
+            if len(self._workers) >= self.size:
+                return None
+            worker = _Worker(self._context)
+            self._workers.add(worker)
+            return worker
+
+    def _discard(self, worker: _Worker):
+        worker.kill()
+        with self._lock:
+            self._workers.discard(worker)
+
+    def _checkout(self, timeout: float) -> _Worker | None:
+        """Вільний процес: з черги простою, новий (якщо пул не повний) або той, що звільниться."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = self._start_worker()
+                if worker is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    try:
+                        # Короткими кроками: місце у пулі звільняється і тоді, коли завислий процес зупинено
+                        worker = self._idle.get(timeout=min(remaining, 0.5))
+                    except queue.Empty:
+                        continue
+            if worker.process.is_alive():
+                return worker
+            self._discard(worker)  # процес завершився, поки простоював (напр. OOM)
+
+    def warm_up(self):
+        while True:
+            worker = self._start_worker()
+            if worker is None:
+                return
+            self._idle.put(worker)
+
+    def run(self, func, args: tuple, timeout: float):
+        started = time.monotonic()
+        worker = self._checkout(timeout)
+        if worker is None:
+            raise PdfRenderBusyError("Забагато PDF-звітів генерується одночасно. Спробуйте за хвилину.")
+        try:
+            result = worker.run(func, args, timeout - (time.monotonic() - started))
+        except TimeoutError:
+            print(f"[PDF POOL] Рендеринг не вклався в {timeout} с, зупиняю процес PID {worker.process.pid}")
+            self._discard(worker)
+            raise PdfRenderTimeoutError("Генерація PDF триває надто довго. Спробуйте ще раз трохи пізніше.")
+        except (EOFError, OSError) as e:
+            print(f"[PDF POOL] Процес PID {worker.process.pid} аварійно завершився: {e!r}")
+            self._discard(worker)
+            raise PdfRenderError("Процес рендерингу PDF аварійно завершився.") from e
+        except PdfRenderError:
+            self._idle.put(worker)  # помилка в даних звіту - процес справний
+            raise
+        self._idle.put(worker)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = list(self._workers), set()
+        for worker in workers:
+            worker.kill()
+
+
+def _get_pool(name: str, size: int) -> _RenderPool:
+    """Пул поточного процесу (після fork кожен воркер gunicorn створює власні)."""
+    global _pools, _pools_pid
+    with _lock:
+        if _pools_pid != os.getpid():
+            _pools, _pools_pid = {}, os.getpid()
+        if name not in _pools:
+            _pools[name] = _RenderPool(size)
+        return _pools[name]
+
+
+def warm_up_pdf_pool():
+    """Запускає процеси пулу заздалегідь, щоб перший PDF не чекав на старт інтерпретатора."""
+    if PDF_RENDER_WORKERS <= 0 or not _PREWARM or is_pool_process():
+        return
+    _get_pool('interactive', PDF_RENDER_WORKERS).warm_up()
+
+
+def _history_points(history: list | None) -> list | None:
+    if not history:
+        return None
+    return [{'date': point.date, 'subscribers': point.subscribers, 'followers': getattr(point, 'followers', None),
+             'er': point.er} for point in history]
+
+
+def _run_in_pool(func, args: tuple, timeout: float):
+    if PDF_RENDER_WORKERS <= 0:
+        return func(*args)
+
+    global _in_flight
+    with _lock:
+        if _in_flight >= _QUEUE_LIMIT:
+            raise PdfRenderBusyError("Забагато PDF-звітів генерується одночасно. Спробуйте за хвилину.")
+        _in_flight += 1
+    try:
+        return _get_pool('interactive', PDF_RENDER_WORKERS).run(func, args, timeout)
+    finally:
+        with _lock:
+            _in_flight -= 1
+
+
+def render_pdf(data: dict, platform: str, history: list = None, avatar_path: str = None,
+               output_path: str = None, timeout: float = PDF_RENDER_TIMEOUT_SECONDS):
+    """
+    Рендерить PDF-звіт у пулі процесів. Повертає байти PDF або, якщо задано
+    output_path, записує звіт у файл і повертає шлях.
+    """
+    return _run_in_pool(_render, (data, platform, _history_points(history), avatar_path, output_path), timeout)
+
+
+def render_portfolio_pdf(source_path: str, output_path: str, summary: dict, history_days: int,
+                         progress_key: str, timeout: float):
+    """
+    Рендерить портфельний звіт у файл output_path з JSONL-файлу каналів source_path.
+    Прогрес ({'rendered', 'total'}) доступний через get_render_progress(progress_key).
+    """
+    args = (source_path, output_path, summary, history_days, progress_key)
+    if PORTFOLIO_RENDER_WORKERS <= 0:
+        return _render_portfolio(*args)
+    # Черга обмежена кількістю потоків задач (PORTFOLIO_JOB_WORKERS), тож окремий ліміт не потрібен
+    return _get_pool('portfolio', PORTFOLIO_RENDER_WORKERS).run(_render_portfolio, args, timeout)
+
+
+def get_render_progress(progress_key: str) -> dict | None:
+    cached = _progress.get(progress_key)
+    return cached[1] if cached is not None else None
+
+
+def shutdown_pdf_pool():
+    global _pools
+    with _lock:
+        pools, _pools = _pools, {}
+    if _pools_pid == os.getpid():
+        for pool in pools.values():
+            pool.shutdown()
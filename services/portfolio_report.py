@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from services.cache_backend import SQLiteCache
+from services.single_flight import file_lock
+from services.analysis_jobs import QUEUED, RUNNING, DONE, ERROR
+from services.history_rollup import get_history_points_many
+from services.insights_generator import generate_pro_insights
+from services.pdf_pool import render_portfolio_pdf, get_render_progress, PdfRenderBusyError, PdfRenderTimeoutError
+from models import db, TrackedAccount, SNAPSHOT_METRICS
+
+# --- Налаштування портфельного звіту ---
+# Один PDF з усіма каналами дашборду, зібраний лише зі збережених знімків (без запитів
+# до Telegram). Канали читаються сторінками й пишуться у JSONL-файл, а PDF верстається
+# з нього по одному каналу прямо у файл, тож великий дашборд не тримається в пам'яті цілим.
+PORTFOLIO_HISTORY_DAYS = int(os.environ.get('PORTFOLIO_HISTORY_DAYS', 7))
+PORTFOLIO_TIMEOUT_SECONDS = int(os.environ.get('PORTFOLIO_REPORT_TIMEOUT_SECONDS', 15 * 60))
+REPORT_DIR = os.environ.get('PORTFOLIO_REPORT_DIR', os.path.join(tempfile.gettempdir(), 'social_pro_reports'))
+_JOB_WORKERS = int(os.environ.get('PORTFOLIO_JOB_WORKERS', 1))
+_PAGE_SIZE = int(os.environ.get('PORTFOLIO_PAGE_SIZE', 100))
+_REPORT_TTL_SECONDS = 60 * 60  # скільки зберігаються задача та готовий файл
+
+# Етапи задачі (поле progress.phase)
+COLLECT = 'collect'
+RENDER = 'render'
+
+# Спільне сховище задач: статус і файл може віддавати будь-який воркер
+_jobs = SQLiteCache('portfolio_jobs')
+_ACTIVE_KEY_PREFIX = 'active:'
+# Стан задачі оновлюють потік задачі та сторінка статусу (будь-який воркер) - read-modify-write під файловим lock
+_JOBS_LOCK_NAME = 'portfolio_jobs'
+
+_executor = None
+_executor_pid = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Пул потоків поточного процесу (після fork кожен воркер створює власний)."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=_JOB_WORKERS, thread_name_prefix='portfolio-report')
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def report_path(job_id: str) -> str:
+    return os.path.join(REPORT_DIR, f"portfolio_{job_id}.pdf")
+
+
+def _source_path(job_id: str) -> str:
+    return os.path.join(REPORT_DIR, f"portfolio_{job_id}.jsonl")
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _remove_expired_reports():
+    """Видаляє файли звітів, старші за час життя задачі."""
+    cutoff = time.time() - _REPORT_TTL_SECONDS
+    for filename in os.listdir(REPORT_DIR):
+        path = os.path.join(REPORT_DIR, filename)
+        try:
+            expired = filename.startswith('portfolio_') and os.path.getmtime(path) < cutoff
+        except OSError:
+            continue
+        if expired:
+            _remove_file(path)
+
+
+def _save(job: dict):
+    _jobs.set(job['id'], job, ttl=_REPORT_TTL_SECONDS)
+
+
+def _update(job_id: str, **fields):
+    with file_lock(_JOBS_LOCK_NAME):
+        cached = _jobs.get(job_id)
+        if cached is None:
+            return
+        job = cached[1]
+        if job['status'] in (DONE, ERROR):
+            return  # задача вже завершена (напр. за таймаутом) - пізній результат ігноруємо
+        job.update(fields)
+        _save(job)
+
+
+def get_portfolio_job(job_id: str) -> dict | None:
+    """Стан задачі з актуальним прогресом верстки; завислу задачу позначає як помилку."""
+    cached = _jobs.get(job_id)
+    if cached is None:
+        return None
+    job = cached[1]
+    if job['status'] in (QUEUED, RUNNING) and time.time() - job['created_at'] > PORTFOLIO_TIMEOUT_SECONDS * 2:
+        _update(job_id, status=ERROR, finished_at=time.time(),
+                error="Звіт формується надто довго. Спробуйте ще раз пізніше.")
+        job = _jobs.get(job_id)[1]
+    if job['status'] == RUNNING and (job.get('progress') or {}).get('phase') == RENDER:
+        rendered = get_render_progress(job_id)
+        if rendered is not None:
+            job['progress'] = {'phase': RENDER, 'processed': rendered['rendered'], 'total': rendered['total']}
+    return job
+
+
+def submit_portfolio_job(app, user_id: int) -> str:
+    """
+    Ставить формування портфельного звіту в чергу і повертає id задачі.
+    Поки звіт користувача формується, повторний запит повертає ту саму задачу.
+    """
+    active_key = f"{_ACTIVE_KEY_PREFIX}{user_id}"
+    active = _jobs.get(active_key)
+    if active is not None:
+        job = get_portfolio_job(active[1])
+        if job is not None and job['status'] in (QUEUED, RUNNING):
+            return job['id']
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    _remove_expired_reports()
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': QUEUED,
+        'user_id': user_id,
+        'created_at': time.time(),
+        'progress': None,
+        'error': None,
+    }
+    _save(job)
+    _jobs.set(active_key, job['id'], ttl=PORTFOLIO_TIMEOUT_SECONDS * 2)
+    _get_executor().submit(_run_job, app, job['id'], active_key, user_id)
+    print(f"[PORTFOLIO] Задача {job['id']} поставлена в чергу для користувача {user_id}")
+    return job['id']
+
+
+def _account_entry(account, channel, snapshot, history: list) -> dict:
+    """Рядок JSONL: лише те, що потрібно для розділу каналу у звіті."""
+    entry = {
+        'name': channel.name or account.account_name,
+        'username': channel.username or account.username,
+        'data': None,
+        'history': [{'date': point.date.isoformat(), 'subscribers': point.subscribers or 0,
+                     'er': point.er or 0} for point in history],
+    }
+    if snapshot is not None:
+        # Відсутні метрики (старі знімки) не потрапляють у словник - картки покажуть значення за замовчуванням
+        data = {metric: getattr(snapshot, metric) for metric in SNAPSHOT_METRICS
+                if getattr(snapshot, metric) is not None}
+        data['insights'] = generate_pro_insights(data)
+        entry['data'] = data
+        entry['snapshot_label'] = f"знімок від {snapshot.date.strftime('%Y-%m-%d %H:%M')} UTC"
+    return entry
+
+
+def _collect_accounts(job_id: str, user_id: int, source_path: str) -> dict:
+    """Пише канали користувача у JSONL сторінками; повертає підсумок для титульної сторінки."""
+    total = TrackedAccount.query.filter_by(user_id=user_id).count()
+    summary = {'accounts': 0, 'subscribers': 0, 'avg_er': 0.0,
+               'generated_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}
+    er_sum, er_count = 0.0, 0
+    cursor = None
+    with open(source_path, 'w', encoding='utf-8') as source:
+        while True:
+            rows, cursor = TrackedAccount.page_with_latest(user_id, limit=_PAGE_SIZE, cursor=cursor)
+            history = get_history_points_many([channel.id for _, channel, _ in rows], PORTFOLIO_HISTORY_DAYS)
+            for account, channel, snapshot in rows:
+                entry = _account_entry(account, channel, snapshot, history.get(channel.id, []))
+                source.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                summary['accounts'] += 1
+                if entry['data']:
+                    summary['subscribers'] += entry['data'].get('subscribers', 0)
+                    if 'er' in entry['data']:
+                        er_sum += entry['data']['er']
+                        er_count += 1
+            # Об'єкти сторінки більше не потрібні - не тримаємо їх у сесії
+            db.session.expunge_all()
+            _update(job_id, progress={'phase': COLLECT, 'processed': summary['accounts'], 'total': total})
+            if cursor is None:
+                break
+    summary['avg_er'] = er_sum / er_count if er_count else 0.0
+    return summary
+
+
+def _run_job(app, job_id: str, active_key: str, user_id: int):
+    source_path = _source_path(job_id)
+    started = time.time()
+    try:
+        _update(job_id, status=RUNNING, started_at=started)
+        with app.app_context():
+            try:
+                summary = _collect_accounts(job_id, user_id, source_path)
+            finally:
+                db.session.remove()
+
+        _update(job_id, progress={'phase': RENDER, 'processed': 0, 'total': summary['accounts']})
+        render_portfolio_pdf(source_path, report_path(job_id), summary, PORTFOLIO_HISTORY_DAYS,
+                             progress_key=job_id, timeout=PORTFOLIO_TIMEOUT_SECONDS)
+        _update(job_id, status=DONE, accounts=summary['accounts'], finished_at=time.time())
+        print(f"[PORTFOLIO] Звіт {job_id}: {summary['accounts']} каналів, {round(time.time() - started, 1)} с")
+    except (PdfRenderBusyError, PdfRenderTimeoutError) as e:
+        _update(job_id, status=ERROR, error=str(e), finished_at=time.time())
+    except Exception as e:
+        print(f"[PORTFOLIO] Помилка задачі {job_id}: {e}")
+        _update(job_id, status=ERROR, error=f"Сталася внутрішня помилка: {e}", finished_at=time.time())
+    finally:
+        _remove_file(source_path)
+        job = _jobs.get(job_id)
+        if job is None or job[1]['status'] != DONE:
+            _remove_file(report_path(job_id))  # недописаний звіт
+        active = _jobs.get(active_key)
+        if active is not None and active[1] == job_id:
+            _jobs.delete(active_key)
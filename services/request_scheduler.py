@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+# --- Смуги пріоритету (менше число - вищий пріоритет) ---
+LANE_PRO = 'pro'                # інтерактивний аналіз Pro-користувача
+LANE_PDF = 'pdf'                # свіжі дані для PDF-звіту (force_fresh)
+LANE_FREE = 'free'              # інтерактивний аналіз безкоштовного тарифу
+LANE_BACKGROUND = 'background'  # оновлення дашборду, SWR, масові оновлення
+
+LANE_PRIORITY = {
+    LANE_PRO: 0,
+    LANE_PDF: 1,
+    LANE_FREE: 2,
+    LANE_BACKGROUND: 3,
+}
+
+# Під навантаженням першим відкидається безкоштовний трафік, потім фоновий
+_SHED_ORDER = (LANE_FREE, LANE_BACKGROUND)
+
+# --- Налаштування бюджету запитів ---
+# Одиниця бюджету - один отриманий канал (кілька викликів API Telegram).
+# Бюджет рахується на процес: при N воркерах gunicorn задавайте rate / N.
+_RATE_PER_SECOND = float(os.environ.get('TELEGRAM_FETCHES_PER_SECOND', 2))
+_BURST = float(os.environ.get('TELEGRAM_FETCH_BURST', 10))
+# Скільки запитів може чекати в черзі кожної смуги
+_LANE_QUEUE_LIMITS = {
+    LANE_PRO: int(os.environ.get('TELEGRAM_QUEUE_LIMIT_PRO', 100)),
+    LANE_PDF: int(os.environ.get('TELEGRAM_QUEUE_LIMIT_PDF', 50)),
+    LANE_FREE: int(os.environ.get('TELEGRAM_QUEUE_LIMIT_FREE', 20)),
+    LANE_BACKGROUND: int(os.environ.get('TELEGRAM_QUEUE_LIMIT_BACKGROUND', 200)),
+}
+# Загальна межа черги: при її досягненні звільняємо місце з найнижчих смуг
+_TOTAL_QUEUE_LIMIT = int(os.environ.get('TELEGRAM_QUEUE_LIMIT_TOTAL', 200))
+
+
+class SchedulerOverloadedError(Exception):
+    """Запит відкинуто планувальником (черга його смуги переповнена)."""
+
+    def __init__(self, lane: str):
+        self.lane = lane
+        super().__init__(f"Черга запитів до Telegram переповнена (смуга '{lane}').")
+
+
+class _Waiter:
+    def __init__(self, future, cost: float):
+        self.future = future
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+
+
+class PriorityScheduler:
+    """
+    Спільний token bucket для всіх запитів до Telegram у процесі та черги
+    за смугами пріоритету. Працює всередині event loop менеджера клієнтів:
+    acquire() повертається, коли для запиту є бюджет і немає запитів
+    з вищим пріоритетом, що чекають.
+    """
+
+    def __init__(self, rate: float = _RATE_PER_SECOND, burst: float = _BURST,
+                 queue_limits: dict = None, total_limit: int = _TOTAL_QUEUE_LIMIT):
+        self.rate = rate
+        self.burst = burst
+        self.queue_limits = dict(_LANE_QUEUE_LIMITS, **(queue_limits or {}))
+        self.total_limit = total_limit
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._queues = {lane: deque() for lane in LANE_PRIORITY}
+        self._dispatcher = None
+        self._stats = {
+            lane: {'granted': 0, 'shed': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+            for lane in LANE_PRIORITY
+        }
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _grant(self, lane: str, waiter: _Waiter = None, cost: float = 0):
+        cost = waiter.cost if waiter else cost
+        self._tokens -= cost
+        stats = self._stats[lane]
+        stats['granted'] += 1
+        if waiter is not None:
+            waited = time.monotonic() - waiter.enqueued_at
+            stats['wait_seconds'] += waited
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], waited)
+            waiter.future.set_result(None)
+
+    def _shed(self, lane: str):
+        self._stats[lane]['shed'] += 1
+        print(f"[SCHEDULER] Відкинуто запит зі смуги '{lane}' (черга переповнена)")
+
+    def _make_room(self, incoming_lane: str) -> bool:
+        """Звільняє місце в загальній черзі за рахунок нижчих смуг. False - відкинути вхідний."""
+        for lane in _SHED_ORDER:
+            if LANE_PRIORITY[lane] <= LANE_PRIORITY[incoming_lane]:
+                continue
+            queue = self._queues[lane]
+            if queue:
+                victim = queue.pop()  # найновіший запит смуги
+                self._shed(lane)
+                victim.future.set_exception(SchedulerOverloadedError(lane))
+                return True
+        return False
+
+    def _affordable(self, cost: float) -> bool:
+        """
+        Запит дорожчий за burst ніколи не дочекався б повного бюджету, тож він
+        стартує з повним bucket і списує всю вартість: бюджет іде в мінус, і
+        наступні запити чекають, доки борг не відновиться (реальне навантаження
+        на Telegram лишається в межах rate).
+        """
+        return self._tokens >= min(cost, self.burst)
+
+    async def acquire(self, lane: str, cost: float = 1):
+        if lane not in LANE_PRIORITY:
+            lane = LANE_BACKGROUND
+        cost = max(cost, 0)
+
+        self._refill()
+        if self._queued() == 0 and self._affordable(cost):
+            self._grant(lane, cost=cost)
+            return
+
+        if len(self._queues[lane]) >= self.queue_limits[lane]:
+            self._shed(lane)
+            raise SchedulerOverloadedError(lane)
+        if self._queued() >= self.total_limit and not self._make_room(lane):
+            self._shed(lane)
+            raise SchedulerOverloadedError(lane)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), cost)
+        self._queues[lane].append(waiter)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._queues[lane]:
+                self._queues[lane].remove(waiter)
+            raise
+
+    async def _dispatch(self):
+        """Видає бюджет запитам у порядку пріоритету смуг, поки черги не порожні."""
+        while True:
+            lane = next((lane for lane in sorted(LANE_PRIORITY, key=LANE_PRIORITY.get)
+                         if self._queues[lane]), None)
+            if lane is None:
+                return
+            waiter = self._queues[lane][0]
+            if waiter.future.done():
+                self._queues[lane].popleft()
+                continue
+            self._refill()
+            if self._affordable(waiter.cost):
+                self._queues[lane].popleft()
+                self._grant(lane, waiter)
+                continue
+            await asyncio.sleep((min(waiter.cost, self.burst) - self._tokens) / self.rate)
+
+    def stats(self) -> dict:
+        # Викликається з потоків Flask - лише читаємо стан, не змінюючи його
+        tokens = min(self.burst, self._tokens + (time.monotonic() - self._updated) * self.rate)
+        return {
+            'rate_per_second': self.rate,
+            'burst': self.burst,
+            'tokens_available': round(tokens, 2),
+            'lanes': {
+                lane: {
+                    'queue_depth': len(self._queues[lane]),
+                    'queue_limit': self.queue_limits[lane],
+                    'granted': stats['granted'],
+                    'shed': stats['shed'],
+                    'avg_wait_seconds': round(stats['wait_seconds'] / stats['granted'], 3) if stats['granted'] else 0,
+                    'max_wait_seconds': round(stats['max_wait_seconds'], 3),
+                }
+                for lane, stats in self._stats.items()
+            }
+        }
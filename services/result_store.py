@@ -0,0 +1,52 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import secrets
+from services.cache_backend import SQLiteCache
+
+# --- Налаштування сховища результатів ---
+# Результати аналізу (з топ/флоп постами та інсайтами) зберігаються на сервері,
+# а в підписаній cookie-сесії лежить лише короткий id результату
+RESULT_TTL_SECONDS = int(os.environ.get('ANALYSIS_RESULT_TTL_SECONDS', 24 * 60 * 60))
+_RESULT_STORE_MAX_BYTES = int(os.environ.get('ANALYSIS_RESULT_STORE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Спільне для всіх воркерів: наступний запит може обслуговувати інший процес
+_results = SQLiteCache('analysis_results', max_bytes=_RESULT_STORE_MAX_BYTES)
+
+
+def save_result(payload: dict) -> str:
+    """Зберігає результат і повертає його id (96 біт випадковості - не вгадати)."""
+    result_id = secrets.token_urlsafe(12)
+    _results.set(result_id, dict(payload, created_at=time.time()), ttl=RESULT_TTL_SECONDS)
+    return result_id
+
+
+def get_result(result_id: str | None) -> dict | None:
+    """Результат за id або None, якщо id немає, він протух чи був витіснений."""
+    if not result_id:
+        return None
+    cached = _results.get(result_id)
+    return cached[1] if cached is not None else None
+
+
+# --- Кеш готових PDF ---
+# Повторне завантаження того самого звіту віддає ті самі байти без рендерингу.
+# Ключ - id результату та хеш вмісту (дані + історія), тож зміна даних дає новий PDF.
+_PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+_pdf_cache = SQLiteCache('pdf_reports', max_bytes=_PDF_CACHE_MAX_BYTES)
+
+
+def content_hash(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def get_rendered_pdf(result_id: str, digest: str) -> bytes | None:
+    cached = _pdf_cache.get(f"{result_id}:{digest}")
+    return base64.b64decode(cached[1]) if cached is not None else None
+
+
+def save_rendered_pdf(result_id: str, digest: str, pdf_bytes: bytes):
+    _pdf_cache.set(f"{result_id}:{digest}", base64.b64encode(pdf_bytes).decode('ascii'), ttl=RESULT_TTL_SECONDS)
@@ -0,0 +1,139 @@
+import os
+import copy
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl  # Міжпроцесні блокування (Linux / macOS)
+except ImportError:
+    fcntl = None
+
+# --- Налаштування ---
+LOCK_DIR = os.environ.get(
+    'SINGLE_FLIGHT_LOCK_DIR',
+    os.path.join(tempfile.gettempdir(), 'social_analytics_locks')
+)
+_WAIT_TIMEOUT_SECONDS = int(os.environ.get('SINGLE_FLIGHT_WAIT_SECONDS', 90))
+_LOCK_POLL_SECONDS = 0.1
+
+_named_locks = {}
+_named_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(name: str):
+    """
+    Ексклюзивний lock між потоками та процесами хоста (LOCK_DIR/<name>.lock),
+    напр. для read-modify-write спільного SQLite-сховища задач.
+    """
+    with _named_locks_guard:
+        thread_lock = _named_locks.setdefault(name, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield  # без fcntl (Windows) - один процес розробки
+            return
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        with open(os.path.join(LOCK_DIR, f"{name}.lock"), 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class _Call:
+    """Запит, що виконується зараз; інші потоки чекають на його результат."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Об'єднує паралельні виклики з однаковим ключем: перший виконує fn(),
+    решта чекають і отримують його результат.
+
+    У межах процесу - через threading.Event. Між воркерами gunicorn
+    (cross_process=True) - через файлове блокування: поки один воркер тримає
+    lock, інші чекають, а потім викликають recheck() (напр. читання спільного
+    кешу). Без спільного кешу recheck() завжди промахується, тож очікування
+    лише затримало б другий воркер - тоді дедуплікуємо тільки в процесі.
+    """
+
+    def __init__(self, lock_dir: str = LOCK_DIR, wait_timeout: float = _WAIT_TIMEOUT_SECONDS,
+                 cross_process: bool = True):
+        self.lock_dir = lock_dir
+        self.wait_timeout = wait_timeout
+        self.cross_process = cross_process and fcntl is not None
+        self._calls = {}
+        self._lock = threading.Lock()
+        if self.cross_process:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key: str, fn, recheck=None):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not is_leader:
+            print(f"[SINGLE-FLIGHT] Чекаю на результат запиту, що вже виконується: {key}")
+            if not call.event.wait(self.wait_timeout):
+                raise TimeoutError(f"Не дочекалися результату для {key}")
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            with self._process_lock(key) as waited:
+                result = recheck() if (waited and recheck) else None
+                if result is None:
+                    result = fn()
+                else:
+                    print(f"[SINGLE-FLIGHT] Результат для {key} отримано від іншого воркера")
+            call.result = result
+            return copy.deepcopy(result)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    @contextmanager
+    def _process_lock(self, key: str):
+        """Файлове блокування між процесами. Повертає True, якщо довелося чекати."""
+        if not self.cross_process:
+            yield False
+            return
+
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        fd = os.open(os.path.join(self.lock_dir, f"{name}.lock"), os.O_CREAT | os.O_RDWR, 0o600)
+        locked = False
+        waited = False
+        try:
+            deadline = time.monotonic() + self.wait_timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                    break
+                except BlockingIOError:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        # Інший воркер завис - не блокуємо користувача назавжди
+                        break
+                    time.sleep(_LOCK_POLL_SECONDS)
+            yield waited
+        finally:
+            if locked:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
@@ -0,0 +1,378 @@
+import os
+import time
+import atexit
+import hashlib
+import asyncio
+import threading
+from collections import deque
+from telethon.errors import FloodWaitError, FloodError, AuthKeyError, UnauthorizedError, ServerError
+from services.request_scheduler import PriorityScheduler, LANE_BACKGROUND
+from services.telegram_transport import create_client, needs_credentials, offline_session_names
+
+
+def _parse_session_strings() -> list:
+    """
+    Пул сесій: TELETHON_SESSION_STRINGS (через кому або з нового рядка)
+    плюс TELETHON_SESSION_STRING для сумісності. Дублікати відкидаються.
+    """
+    raw = os.environ.get('TELETHON_SESSION_STRINGS', '').replace('\n', ',')
+    sessions = [s.strip() for s in raw.split(',') if s.strip()]
+    single = os.environ.get('TELETHON_SESSION_STRING')
+    if single:
+        sessions.append(single.strip())
+    return list(dict.fromkeys(sessions))
+
+
+# --- Налаштування менеджера клієнтів ---
+API_ID = os.environ.get('TELEGRAM_API_ID')
+API_HASH = os.environ.get('TELEGRAM_API_HASH')
+SESSION_STRINGS = _parse_session_strings()
+
+if needs_credentials() and not all([API_ID, API_HASH, SESSION_STRINGS]):
+    print("ПОПЕРЕДЖЕННЯ: Змінні Telegram (API_ID, API_HASH, SESSION_STRING) не налаштовані в .env")
+
+_HEALTH_CHECK_INTERVAL_SECONDS = int(os.environ.get('TELEGRAM_HEALTH_CHECK_SECONDS', 30))
+_REQUEST_TIMEOUT_SECONDS = int(os.environ.get('TELEGRAM_REQUEST_TIMEOUT_SECONDS', 60))
+_CONNECT_TIMEOUT_SECONDS = 30
+_SHUTDOWN_TIMEOUT_SECONDS = 10
+# FloodWait довший за цей поріг не "проспується" всередині Telethon, а виводить
+# сесію з ротації, і запит переходить на іншу сесію пулу
+_FLOOD_SLEEP_THRESHOLD_SECONDS = int(os.environ.get('TELEGRAM_FLOOD_SLEEP_THRESHOLD', 5))
+# Частка помилок рахується по останніх N запитах сесії
+_ERROR_RATE_WINDOW = 50
+# Помилки, які свідчать про проблему сесії, а не конкретного каналу
+_SESSION_ERRORS = (ConnectionError, asyncio.TimeoutError, FloodWaitError, FloodError,
+                   AuthKeyError, UnauthorizedError, ServerError)
+
+
+def _root_error(error: BaseException) -> BaseException:
+    """Первинний виняток (парсер обгортає помилки Telethon у TelegramFetchError)."""
+    while error.__cause__ is not None and error.__cause__ is not error:
+        error = error.__cause__
+    return error
+
+
+class NoAuthorizedClientError(ConnectionError):
+    """У пулі немає жодного підключеного та авторизованого клієнта."""
+
+
+class _ClientSlot:
+    """Один клієнт Telethon у пулі та його стан."""
+
+    def __init__(self, index: int, session_string: str):
+        self.index = index
+        self.session_string = session_string
+        # Стабільний ідентифікатор сесії (напр. для індексу access_hash)
+        self.scope = hashlib.sha1(session_string.encode('utf-8')).hexdigest()[:16]
+        self.client = None
+        self.authorized = False
+        self.in_flight = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.lock = None  # asyncio.Lock, створюється всередині loop
+        # Облік навантаження та збоїв сесії
+        self.flood_until = 0.0  # time.monotonic(), до якого сесія під FloodWait
+        self.flood_waits = 0
+        self.requests = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.recent_outcomes = deque(maxlen=_ERROR_RATE_WINDOW)  # True - помилка сесії
+
+    def is_healthy(self) -> bool:
+        return self.client is not None and self.authorized and self.client.is_connected()
+
+    def flood_remaining(self, now: float = None) -> float:
+        return max(0.0, self.flood_until - (now or time.monotonic()))
+
+    def is_available(self, now: float = None) -> bool:
+        """Підключена, авторизована і не під FloodWait."""
+        return self.is_healthy() and self.flood_remaining(now) == 0
+
+    @property
+    def error_rate(self) -> float:
+        if not self.recent_outcomes:
+            return 0.0
+        return sum(self.recent_outcomes) / len(self.recent_outcomes)
+
+    def record(self, error: BaseException | None, elapsed: float):
+        self.requests += 1
+        self.busy_seconds += elapsed
+        is_session_error = error is not None and isinstance(error, _SESSION_ERRORS)
+        self.recent_outcomes.append(is_session_error)
+        if is_session_error:
+            self.errors += 1
+            self.last_error = str(error)
+
+
+class TelegramClientManager:
+    """
+    Тримає фоновий event loop в окремому потоці та пул підключених,
+    авторизованих клієнтів Telethon. Синхронні Flask-хендлери передають
+    сюди корутини і отримують назад concurrent.futures.Future.
+    """
+
+    def __init__(self, session_strings: list, api_id: int, api_hash: str):
+        self._api_id = api_id
+        self._api_hash = api_hash
+        self._slots = [_ClientSlot(i, s) for i, s in enumerate(session_strings)]
+        self._scheduler = PriorityScheduler()
+        self._loop = None
+        self._thread = None
+        self._health_task = None
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._started_at = time.monotonic()
+        self.pid = os.getpid()
+
+    # --- Життєвий цикл ---
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            if self._closed:
+                raise RuntimeError("Менеджер клієнтів Telegram уже зупинено.")
+
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run_loop, args=(ready,),
+                name='telegram-client-manager', daemon=True
+            )
+            self._thread.start()
+            ready.wait()
+
+            future = asyncio.run_coroutine_threadsafe(self._startup(), self._loop)
+            try:
+                future.result(timeout=_CONNECT_TIMEOUT_SECONDS)
+            except Exception as e:
+                # Не падаємо: health-check та _acquire_slot спробують перепідключитись
+                print(f"ПОПЕРЕДЖЕННЯ: Не вдалося підключити клієнти Telegram при старті: {e}")
+            self._started = True
+            print(f"Менеджер клієнтів Telegram запущено (клієнтів: {len(self._slots)}, PID {self.pid}).")
+
+    def _run_loop(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    async def _startup(self):
+        for slot in self._slots:
+            slot.lock = asyncio.Lock()
+        await asyncio.gather(*(self._ensure_connected(slot) for slot in self._slots))
+        self._health_task = asyncio.ensure_future(self._health_loop())
+
+    def shutdown(self):
+        """Відключає всі клієнти та зупиняє фоновий loop."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if not self._started:
+                return
+
+        future = asyncio.run_coroutine_threadsafe(self._disconnect_all(), self._loop)
+        try:
+            future.result(timeout=_SHUTDOWN_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"Помилка при відключенні клієнтів Telegram: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=_SHUTDOWN_TIMEOUT_SECONDS)
+        if not self._thread.is_alive():
+            self._loop.close()
+        print(f"Менеджер клієнтів Telegram зупинено (PID {self.pid}).")
+
+    async def _disconnect_all(self):
+        if self._health_task:
+            self._health_task.cancel()
+        for slot in self._slots:
+            if slot.client is not None:
+                try:
+                    await slot.client.disconnect()
+                except Exception as e:
+                    print(f"Помилка відключення клієнта #{slot.index}: {e}")
+
+    # --- Підключення та health-check ---
+
+    async def _ensure_connected(self, slot: _ClientSlot):
+        async with slot.lock:
+            try:
+                if slot.client is None:
+                    slot.client = create_client(
+                        slot.session_string, self._api_id, self._api_hash,
+                        flood_sleep_threshold=_FLOOD_SLEEP_THRESHOLD_SECONDS
+                    )
+                    slot.client.session_scope = slot.scope
+                if not slot.client.is_connected():
+                    if slot.authorized:
+                        slot.reconnects += 1
+                        print(f"[TG POOL] Перепідключаю клієнт #{slot.index}...")
+                    await slot.client.connect()
+                    slot.authorized = await slot.client.is_user_authorized()
+                    if not slot.authorized:
+                        print(f"ПОМИЛКА: Сесія Telethon #{slot.index} не авторизована.")
+            except Exception as e:
+                slot.authorized = False
+                slot.last_error = str(e)
+                print(f"[TG POOL] Не вдалося підключити клієнт #{slot.index}: {e}")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(_HEALTH_CHECK_INTERVAL_SECONDS)
+            for slot in self._slots:
+                if not slot.is_healthy():
+                    await self._ensure_connected(slot)
+
+    async def _acquire_slot(self, exclude: set = frozenset()) -> _ClientSlot:
+        """
+        Найменш завантажена доступна сесія (при рівності - з меншою часткою помилок).
+        Сесії під FloodWait пропускаються; якщо під FloodWait усі - FloodWaitError
+        з найменшим часом очікування.
+        """
+        candidates = [s for s in self._slots if s.index not in exclude]
+        healthy = [s for s in candidates if s.is_healthy()]
+        if not healthy:
+            await asyncio.gather(*(self._ensure_connected(s) for s in candidates))
+            healthy = [s for s in candidates if s.is_healthy()]
+        if not healthy:
+            raise NoAuthorizedClientError("Немає жодного підключеного та авторизованого клієнта Telegram.")
+
+        now = time.monotonic()
+        available = [s for s in healthy if s.is_available(now)]
+        if not available:
+            wait = min(s.flood_remaining(now) for s in self._slots if s.is_healthy())
+            raise FloodWaitError(request=None, capture=max(1, int(wait + 0.999)))
+        return min(available, key=lambda s: (s.in_flight, s.error_rate, s.requests))
+
+    async def _run_with_client(self, coro_factory, lane: str, cost: float):
+        """
+        Чекає на бюджет у планувальнику (за пріоритетом смуги) і виконує
+        coro_factory на одній із сесій. Якщо сесія отримала FloodWait,
+        вона виводиться з ротації до його завершення, а запит повторюється
+        на іншій сесії (кожна сесія - не більше одного разу).
+        """
+        if cost:
+            await self._scheduler.acquire(lane, cost)
+        tried = set()
+        while True:
+            slot = await self._acquire_slot(exclude=tried)
+            tried.add(slot.index)
+            slot.in_flight += 1
+            started = time.monotonic()
+            try:
+                result = await coro_factory(slot.client)
+                slot.record(None, time.monotonic() - started)
+                return result
+            except Exception as e:
+                root = _root_error(e)
+                slot.record(root, time.monotonic() - started)
+                if isinstance(root, UnauthorizedError):
+                    slot.authorized = False  # health-check перевірить сесію знову
+                if not isinstance(root, FloodWaitError):
+                    raise
+                slot.flood_until = time.monotonic() + root.seconds
+                slot.flood_waits += 1
+                print(f"[TG POOL] Сесія #{slot.index} під FloodWait на {root.seconds} с - виводжу з ротації")
+                if len(tried) >= len(self._slots):
+                    raise
+            finally:
+                slot.in_flight -= 1
+
+    # --- Публічний API для синхронного коду ---
+
+    def submit(self, coro_factory, lane: str = LANE_BACKGROUND, cost: float = 1):
+        """
+        Планує coro_factory(client) у фоновому loop.
+        lane - смуга пріоритету (services.request_scheduler), cost - скільки
+        одиниць спільного бюджету запитів займає виклик (0 - корутина сама
+        списує бюджет через acquire_budget у міру своїх запитів).
+        Повертає concurrent.futures.Future.
+        """
+        if not self._started:
+            self.start()
+        if self._closed:
+            raise RuntimeError("Менеджер клієнтів Telegram уже зупинено.")
+        return asyncio.run_coroutine_threadsafe(self._run_with_client(coro_factory, lane, cost), self._loop)
+
+    async def acquire_budget(self, lane: str, cost: float = 1):
+        """Бюджет для чергового запиту всередині корутини (викликається лише з loop менеджера)."""
+        await self._scheduler.acquire(lane, cost)
+
+    def run(self, coro_factory, timeout: float = None, lane: str = LANE_BACKGROUND, cost: float = 1):
+        """Синхронно виконує coro_factory(client) і повертає результат."""
+        future = self.submit(coro_factory, lane=lane, cost=cost)
+        try:
+            return future.result(timeout=timeout or _REQUEST_TIMEOUT_SECONDS)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def health(self) -> dict:
+        """Стан пулу та навантаження кожної сесії для моніторингу."""
+        now = time.monotonic()
+        uptime = max(now - self._started_at, 1e-9)
+        return {
+            'pid': self.pid,
+            'running': self._started and not self._closed,
+            'sessions_total': len(self._slots),
+            'sessions_available': sum(1 for s in self._slots if s.is_available(now)),
+            'scheduler': self._scheduler.stats(),
+            'clients': [
+                {
+                    'index': slot.index,
+                    'scope': slot.scope,
+                    'connected': bool(slot.client and slot.client.is_connected()),
+                    'authorized': slot.authorized,
+                    'in_flight': slot.in_flight,
+                    'requests': slot.requests,
+                    'errors': slot.errors,
+                    'error_rate': round(slot.error_rate, 3),
+                    'flood_waits': slot.flood_waits,
+                    'flood_wait_remaining': int(slot.flood_remaining(now)),
+                    'utilization': round(slot.busy_seconds / uptime, 3),
+                    'reconnects': slot.reconnects,
+                    'last_error': slot.last_error,
+                }
+                for slot in self._slots
+            ]
+        }
+
+
+# --- Глобальний менеджер процесу ---
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_client_manager() -> TelegramClientManager:
+    """
+    Повертає менеджер клієнтів поточного процесу (створює при першому виклику).
+    Після fork (gunicorn) кожен воркер отримує власний менеджер.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None or _manager.pid != os.getpid():
+            if not needs_credentials():
+                # fake / replay: мережа та справжні сесії не потрібні
+                _manager = TelegramClientManager(SESSION_STRINGS or offline_session_names(),
+                                                 int(API_ID or 0), API_HASH or '')
+            elif not all([API_ID, API_HASH, SESSION_STRINGS]):
+                raise ValueError("API_ID, API_HASH та TELETHON_SESSION_STRING(S) повинні бути встановлені в .env")
+            else:
+                _manager = TelegramClientManager(SESSION_STRINGS, int(API_ID), API_HASH)
+        manager = _manager
+    manager.start()
+    return manager
+
+
+def shutdown_client_manager():
+    """Коректно зупиняє менеджер (викликається при виході воркера)."""
+    global _manager
+    with _manager_lock:
+        manager = _manager
+        _manager = None
+    if manager is not None and manager.pid == os.getpid():
+        manager.shutdown()
+
+
+atexit.register(shutdown_client_manager)
@@ -0,0 +1,98 @@
+from telethon.errors import (
+    ChannelInvalidError, ChannelPrivateError, ChannelPublicGroupNaError, ChannelBannedError,
+    UsernameInvalidError, UsernameNotOccupiedError,
+    InviteHashInvalidError, InviteHashExpiredError,
+    FloodWaitError, FloodError,
+    AuthKeyError, UnauthorizedError,
+)
+from services.telegram_client_manager import NoAuthorizedClientError
+from services.request_scheduler import SchedulerOverloadedError
+
+# --- Типи збоїв ---
+NOT_FOUND = 'not_found'
+PRIVATE = 'private'
+FLOOD_WAIT = 'flood_wait'
+AUTH_BROKEN = 'auth_broken'
+TRANSIENT = 'transient'
+OVERLOADED = 'overloaded'
+INTERNAL = 'internal'  # конфігурація сервісу або помилка в коді - не стосується каналу
+
+# Скільки секунд пам'ятаємо збій кожного типу (негативний кеш).
+# Для FLOOD_WAIT береться час, який повернув Telegram.
+FAILURE_TTL_SECONDS = {
+    NOT_FOUND: 60 * 60,   # 1 година - неіснуючі username рідко з'являються
+    PRIVATE: 30 * 60,     # 30 хвилин - канал можуть зробити публічним
+    FLOOD_WAIT: 60,
+    AUTH_BROKEN: 60,      # сесію лагодить адміністратор, перевіряємо часто
+    TRANSIENT: 15,
+    OVERLOADED: 0,        # стосується черги, а не каналу - не кешуємо
+    INTERNAL: 0,          # не кешуємо: інакше канал "зламаний", доки не мине TTL
+}
+
+FAILURE_MESSAGES = {
+    NOT_FOUND: "Канал не знайдено. Перевірте посилання.",
+    PRIVATE: "Канал приватний або недоступний для аналізу.",
+    FLOOD_WAIT: "Telegram тимчасово обмежив запити. Спробуйте через {retry_after} с.",
+    AUTH_BROKEN: "Сервіс аналізу Telegram тимчасово недоступний. Спробуйте пізніше.",
+    TRANSIENT: "Не вдалося отримати дані з Telegram. Спробуйте ще раз.",
+    OVERLOADED: "Сервіс зараз перевантажений. Спробуйте за хвилину.",
+    INTERNAL: "Сервіс аналізу Telegram тимчасово недоступний. Спробуйте пізніше.",
+}
+
+
+class TelegramFetchError(Exception):
+    """Типізований збій отримання даних каналу (kind - один із типів вище)."""
+
+    def __init__(self, kind: str, detail: str = '', retry_after: int = None):
+        self.kind = kind
+        self.detail = detail
+        self.retry_after = retry_after
+        super().__init__(f"{kind}: {detail}" if detail else kind)
+
+    @property
+    def user_message(self) -> str:
+        return FAILURE_MESSAGES[self.kind].format(retry_after=self.retry_after or FAILURE_TTL_SECONDS[FLOOD_WAIT])
+
+    @property
+    def ttl(self) -> int:
+        if self.kind == FLOOD_WAIT and self.retry_after:
+            return self.retry_after
+        return FAILURE_TTL_SECONDS[self.kind]
+
+    def to_dict(self) -> dict:
+        return {'kind': self.kind, 'detail': self.detail, 'retry_after': self.retry_after}
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> 'TelegramFetchError':
+        return cls(payload['kind'], payload.get('detail', ''), payload.get('retry_after'))
+
+
+def classify_exception(error: Exception) -> TelegramFetchError:
+    """Перетворює виняток Telethon / пулу клієнтів на TelegramFetchError."""
+    if isinstance(error, TelegramFetchError):
+        return error
+    detail = str(error)
+
+    if isinstance(error, (ChannelInvalidError, UsernameInvalidError, UsernameNotOccupiedError,
+                          InviteHashInvalidError)):
+        return TelegramFetchError(NOT_FOUND, detail)
+    if isinstance(error, (ChannelPrivateError, ChannelPublicGroupNaError, ChannelBannedError,
+                          InviteHashExpiredError)):
+        return TelegramFetchError(PRIVATE, detail)
+    if isinstance(error, FloodWaitError):
+        return TelegramFetchError(FLOOD_WAIT, detail, retry_after=int(error.seconds) or None)
+    if isinstance(error, FloodError):
+        return TelegramFetchError(FLOOD_WAIT, detail)
+    if isinstance(error, (AuthKeyError, UnauthorizedError)):
+        return TelegramFetchError(AUTH_BROKEN, detail)
+    if isinstance(error, SchedulerOverloadedError):
+        return TelegramFetchError(OVERLOADED, detail)
+    # Пул клієнтів без жодної авторизованої сесії
+    if isinstance(error, NoAuthorizedClientError):
+        return TelegramFetchError(AUTH_BROKEN, detail)
+    # ValueError / TypeError поза резолвом каналу (його "не знайдено" розпізнає
+    # _resolve_channel) - це конфігурація (напр. немає API_ID) або помилка в коді
+    if isinstance(error, (ValueError, TypeError)):
+        return TelegramFetchError(INTERNAL, detail)
+    # Таймаути, обриви з'єднання, внутрішні помилки Telegram (RPCError 5xx) тощо
+    return TelegramFetchError(TRANSIENT, detail)
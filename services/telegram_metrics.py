@@ -0,0 +1,191 @@
+import heapq
+import operator
+from array import array
+from itertools import compress
+from datetime import datetime, timezone, timedelta
+
+# Скільки Top/Flop постів показуємо
+TOP_FLOP_SIZE = 3
+
+
+def post_link(post: dict, entity_username: str | None) -> str:
+    if entity_username:
+        return f"https://t.me/{entity_username}/{post['id']}"
+    else:
+        return f"https://t.me/c/{post['channel_id']}/{post['id']}"
+
+
+def post_summary(post: dict, entity_username: str | None) -> dict:
+    """Елемент списку top_posts / flop_posts."""
+    return {
+        'text': post['text'] + '...',
+        'views': post['views'],
+        'link': post_link(post, entity_username)
+    }
+
+
+class PostColumns:
+    """
+    Колонкове представлення списку постів: перегляди, реакції, дати та id
+    у компактних масивах array, щоб агрегати рахувались у C (sum/min/max/compress),
+    а не в циклі Python по словниках.
+    """
+
+    def __init__(self, posts: list):
+        self.posts = posts
+        self.ids = array('q', [post['id'] for post in posts])
+        self.views = array('q', [post['views'] or 0 for post in posts])
+        self.reactions = array('q', [post['reactions'] for post in posts])
+        self.dates = array('q', [post['date'] for post in posts])
+        self.has_text = bytes(post['text'] is not None for post in posts)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def calculate_pro_metrics(posts: list, subscribers_count: int, entity_username: str | None,
+                          now: datetime = None, top_size: int = TOP_FLOP_SIZE) -> tuple:
+    """
+    Векторизований розрахунок Pro-метрик по колонках PostColumns.
+    Результат ідентичний попередньому циклу по постах:
+    (avg_views, er, posts_per_day, top_posts, flop_posts, reaction_rate, min_views, max_views)
+    """
+    if not posts:
+        return 0, 0, 0, [], [], 0, 0, 0
+
+    columns = PostColumns(posts)
+    views = columns.views
+    now = now or datetime.now(timezone.utc)
+    one_day_ago = (now - timedelta(days=1)).timestamp()
+
+    # Пости без переглядів (None / 0) не враховуються у середніх
+    valid_posts = len(views) - views.count(0)
+    total_views = sum(views)
+    total_reactions = sum(compress(columns.reactions, views))
+    avg_views = total_views / valid_posts if valid_posts > 0 else 0
+    avg_reactions = total_reactions / valid_posts if valid_posts > 0 else 0
+
+    # 1. ER
+    er = 0
+    if subscribers_count > 0:
+        er = (avg_views / subscribers_count) * 100
+
+    # 2. Частота постингу
+    posts_per_day = 0
+    if len(columns) > 1:
+        days_diff = (columns.dates[0] - columns.dates[-1]) / (60 * 60 * 24)
+        if days_diff < 1:
+            days_diff = 1
+        posts_per_day = len(columns) / days_diff
+
+    # 3. Top/Flop - часткова вибірка k елементів замість повного сортування.
+    # Ключ (-views, index) відтворює стабільний sorted(..., reverse=True).
+    candidates = list(compress(range(len(columns)), map(operator.and_, map(bool, views), columns.has_text)))
+    top = heapq.nsmallest(top_size, candidates, key=lambda i: (-views[i], i))
+    flop = heapq.nlargest(top_size, candidates, key=lambda i: (-views[i], i))
+    flop.reverse()
+    top_posts = [post_summary(posts[i], entity_username) for i in top]
+    flop_posts = [post_summary(posts[i], entity_username) for i in flop]
+
+    # 4. Коефіцієнт Реакцій (RR)
+    reaction_rate = 0
+    if avg_views > 0:
+        reaction_rate = (avg_reactions / avg_views) * 100
+
+    # 5. Стабільність переглядів - тільки "зрілі" пости (> 24 год)
+    mature_views = list(filter(None, compress(views, map(one_day_ago.__gt__, columns.dates))))
+    min_views = min(mature_views) if mature_views else 0
+    max_views = max(mature_views) if mature_views else 0
+
+    return avg_views, er, posts_per_day, top_posts, flop_posts, reaction_rate, min_views, max_views
+
+
+class StreamingPostMetrics:
+    """
+    Рахує ті самі метрики, що й calculate_pro_metrics, але потоково:
+    пости подаються по одному (від найновішого до найстарішого) через add(),
+    у пам'яті тримаються лише лічильники та дві купи розміром TOP_FLOP_SIZE.
+    """
+
+    def __init__(self, now: datetime = None, top_size: int = TOP_FLOP_SIZE):
+        now = now or datetime.now(timezone.utc)
+        self.one_day_ago = (now - timedelta(days=1)).timestamp()
+        self.top_size = top_size
+
+        self.count = 0
+        self.newest_date = None
+        self.oldest_date = None
+        self.total_views = 0
+        self.total_reactions = 0
+        self.valid_posts = 0
+        self.mature_min = None
+        self.mature_max = None
+
+        # Порядок як у sorted(..., key=views, reverse=True): більше переглядів - вище,
+        # при рівних переглядах - новіший пост (менший index) вище.
+        # _top: min-купа з ключем (views, -index) - корінь є "найгіршим" у Top.
+        # _flop: min-купа з ключем (-views, index) - корінь є "найкращим" у Flop.
+        self._top = []
+        self._flop = []
+
+    def add(self, post: dict):
+        index = self.count
+        self.count += 1
+        if self.newest_date is None:
+            self.newest_date = post['date']
+        self.oldest_date = post['date']
+
+        views = post['views']
+        if not views:
+            return
+
+        self.total_views += views
+        self.valid_posts += 1
+        self.total_reactions += post['reactions']
+        if post['date'] < self.one_day_ago:
+            self.mature_min = views if self.mature_min is None else min(self.mature_min, views)
+            self.mature_max = views if self.mature_max is None else max(self.mature_max, views)
+
+        if post['text'] is None:
+            return
+        self._push(self._top, (views, -index, post))
+        self._push(self._flop, (-views, index, post))
+
+    def _push(self, heap: list, item: tuple):
+        if len(heap) < self.top_size:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+    def result(self, subscribers_count: int, entity_username: str | None) -> tuple:
+        """Повертає кортеж у форматі calculate_pro_metrics."""
+        if self.count == 0:
+            return 0, 0, 0, [], [], 0, 0, 0
+
+        avg_views = self.total_views / self.valid_posts if self.valid_posts > 0 else 0
+        avg_reactions = self.total_reactions / self.valid_posts if self.valid_posts > 0 else 0
+
+        er = 0
+        if subscribers_count > 0:
+            er = (avg_views / subscribers_count) * 100
+
+        posts_per_day = 0
+        if self.count > 1:
+            days_diff = (self.newest_date - self.oldest_date) / (60 * 60 * 24)
+            if days_diff < 1:
+                days_diff = 1
+            posts_per_day = self.count / days_diff
+
+        top = sorted(self._top, key=lambda item: (-item[0], -item[1]))
+        flop = sorted(self._flop, key=lambda item: (item[0], item[1]))
+        top_posts = [post_summary(item[2], entity_username) for item in top]
+        flop_posts = [post_summary(item[2], entity_username) for item in flop]
+
+        reaction_rate = 0
+        if avg_views > 0:
+            reaction_rate = (avg_reactions / avg_views) * 100
+
+        min_views = self.mature_min or 0
+        max_views = self.mature_max or 0
+
+        return avg_views, er, posts_per_day, top_posts, flop_posts, reaction_rate, min_views, max_views
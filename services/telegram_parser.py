@@ -1,219 +1,597 @@
 import os
+import math
 import asyncio
-import uuid
-from telethon.sync import TelegramClient
-from telethon.sessions import StringSession
 from telethon.tl.functions.channels import GetFullChannelRequest
+from telethon.tl.functions.messages import GetMessagesViewsRequest, GetMessagesReactionsRequest
+from telethon.tl.types import UpdateMessageReactions, InputChannel, Channel
 from telethon.errors import ChannelInvalidError, ChannelPrivateError
 import time
-from datetime import datetime, timezone, timedelta # 1. Додаємо timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.telegram_client_manager import get_client_manager
+from services.cache_backend import create_cache_backend, SQLiteCache
+from services.single_flight import SingleFlight
+from services.avatar_store import get_channel_avatar, avatar_static_file
+from services.entity_index import lookup_peer, remember_peer, invalidate_peer
+from services.telegram_metrics import StreamingPostMetrics, calculate_pro_metrics
+from services.telegram_errors import TelegramFetchError, classify_exception, NOT_FOUND, PRIVATE
+from services.request_scheduler import LANE_PRO, LANE_FREE, LANE_BACKGROUND
+from utils import normalize_channel_url
 
 # --- Налаштування кешу ---
-_cache = {}
+# Бекенд обирається через ANALYTICS_CACHE_BACKEND (memory | sqlite)
+_cache = create_cache_backend('analytics')
 _CACHE_TIMEOUT_SECONDS = 300  # 5 хвилин
+# Pro-метрики, які не показуються безкоштовному тарифу
+PRO_ONLY_FIELDS = ('er', 'posts_per_day', 'top_posts', 'flop_posts', 'reaction_rate', 'min_views', 'max_views')
+# Негативний кеш: відомі збої (канал не існує, приватний, FloodWait...)
+# зберігаються за каналом, кожен тип зі своїм TTL (див. telegram_errors)
+_FAILURE_KEY_PREFIX = 'failure:'
 
-# --- Завантаження конфігурації ---
-API_ID = os.environ.get('TELEGRAM_API_ID')
-API_HASH = os.environ.get('TELEGRAM_API_HASH')
-SESSION_STRING = os.environ.get('TELETHON_SESSION_STRING')
-
-if not all([API_ID, API_HASH, SESSION_STRING]):
-    print("ПОПЕРЕДЖЕННЯ: Змінні Telegram (API_ID, API_HASH, SESSION_STRING) не налаштовані в .env")
-
-TEMP_AVATAR_DIR = os.path.join(os.path.dirname(__file__), '..', 'static', 'temp_avatars')
-os.makedirs(TEMP_AVATAR_DIR, exist_ok=True)
-
-
-# --- PRO FUNCTIONS (ОНОВЛЕНО) ---
-
-def _calculate_telegram_pro_metrics(messages, subscribers_count, entity_username):
-    """
-    Розраховує ER, частоту, Top/Flop, RR,
-    ТАКОЖ: Стабільність переглядів ТІЛЬКИ для "зрілих" постів.
-    """
-    if not messages:
-        return 0, 0, 0, [], [], 0, 0, 0 
-
-    total_views = 0
-    total_reactions = 0 
-    valid_posts = 0
-    
-    # --- 2. НОВІ СПИСКИ для "зрілих" постів ---
-    now = datetime.now(timezone.utc)
-    one_day_ago = now - timedelta(days=1)
-    mature_view_list = [] # Список переглядів ТІЛЬКИ для постів > 24 год.
-    # ----------------------------------------
-
-    for msg in messages:
-        if msg.views:
-            total_views += msg.views
-            valid_posts += 1
-            
-            # --- 3. НОВА ЛОГІКА ---
-            # Додаємо перегляди в список "зрілих",
-            # ТІЛЬКИ ЯКЩО пост старший за 24 години
-            if msg.date < one_day_ago:
-                mature_view_list.append(msg.views)
-            # ---------------------
-            
-            if msg.reactions and msg.reactions.results:
-                for reaction in msg.reactions.results:
-                    total_reactions += reaction.count
-            
-    avg_views = total_views / valid_posts if valid_posts > 0 else 0
-    avg_reactions = total_reactions / valid_posts if valid_posts > 0 else 0 
-
-    # 1. ER
-    er = 0
-    if subscribers_count > 0:
-        er = (avg_views / subscribers_count) * 100
-
-    # 2. Частота постингу
-    posts_per_day = 0
-    if len(messages) > 1:
-        newest_post_date = messages[0].date
-        oldest_post_date = messages[-1].date
-        time_diff = newest_post_date - oldest_post_date
-        days_diff = time_diff.total_seconds() / (60 * 60 * 24)
-        if days_diff < 1:
-            days_diff = 1
-        posts_per_day = len(messages) / days_diff
-
-    # 3. Top/Flop (тут логіка без змін, вона правильна)
-    sorted_posts = sorted(
-        [msg for msg in messages if msg.views and msg.message], 
-        key=lambda x: x.views, 
-        reverse=True
-    )
-    
-    def get_post_link(msg):
-        if entity_username:
-            return f"https://t.me/{entity_username}/{msg.id}"
+# Stale-while-revalidate: протягом цього вікна після TTL віддаємо старі дані
+# одразу, а свіжі підтягуємо у фоні
+SWR_GRACE_SECONDS = int(os.environ.get('ANALYTICS_SWR_GRACE_SECONDS', 600))
+_revalidation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='swr-revalidate')
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+# Паралельні запити одного каналу об'єднуються в один похід до Telegram
+# (між воркерами - лише коли кеш спільний і результат іншого воркера можна прочитати)
+_single_flight = SingleFlight(cross_process=isinstance(_cache, SQLiteCache))
+
+# Пакетне отримання: скільки каналів обробляємо одночасно на одному клієнті
+_BATCH_CONCURRENCY = int(os.environ.get('TELEGRAM_BATCH_CONCURRENCY', 5))
+_BATCH_WAVE_TIMEOUT_SECONDS = 60
+
+# Вікно останніх постів та high-water mark для інкрементальних оновлень
+_POSTS_WINDOW = 20
+_POST_WINDOW_TTL_SECONDS = 7 * 24 * 60 * 60  # 7 днів
+_post_windows = create_cache_backend('post_windows')
+
+# Глибокий аналіз (Pro): сотні-тисячі постів потоково через iter_messages
+DEEP_MAX_POSTS = int(os.environ.get('TELEGRAM_DEEP_MAX_POSTS', 1000))
+_DEEP_MAX_SECONDS = int(os.environ.get('TELEGRAM_DEEP_MAX_SECONDS', 45))
+_DEEP_CACHE_TIMEOUT_SECONDS = 60 * 60  # 1 година
+_DEEP_PROGRESS_EVERY = 100
+# Скільки постів глибокого аналізу відповідає одиниці бюджету планувальника
+_DEEP_POSTS_PER_BUDGET_UNIT = 100
+
+
+# --- ЗНІМКИ ПОСТІВ ---
+
+def _snapshot_message(msg) -> dict:
+    """
+    Компактний знімок поста (лише те, що потрібно для метрик).
+    Зберігається у вікні постів між оновленнями, тому - тільки JSON-типи.
+    """
+    reactions = 0
+    if msg.reactions and msg.reactions.results:
+        for reaction in msg.reactions.results:
+            reactions += reaction.count
+    return {
+        'id': msg.id,
+        'date': int(msg.date.timestamp()),
+        'views': msg.views,
+        'reactions': reactions,
+        'text': msg.message.split('\n')[0][:50] if msg.message else None,
+        'channel_id': getattr(msg.peer_id, 'channel_id', None),
+    }
+
+
+# --- ІНКРЕМЕНТАЛЬНЕ ВІКНО ПОСТІВ ---
+
+async def _refresh_post_counters(client, entity, posts: list) -> list | None:
+    """
+    Дешево оновлює перегляди та реакції вже відомих постів
+    (без повторного завантаження самих повідомлень).
+    Повертає None, якщо якийсь пост зник - тоді вікно треба перечитати повністю.
+    """
+    ids = [post['id'] for post in posts]
+    views_result = await client(GetMessagesViewsRequest(peer=entity, id=ids, increment=False))
+    if len(views_result.views) != len(posts):
+        return None
+
+    refreshed = []
+    for post, message_views in zip(posts, views_result.views):
+        if message_views.views is None and post['views']:
+            return None  # пост видалено
+        refreshed.append(dict(post, views=message_views.views))
+
+    reactions_result = await client(GetMessagesReactionsRequest(peer=entity, id=ids))
+    reactions_by_id = {}
+    for update in getattr(reactions_result, 'updates', []):
+        if isinstance(update, UpdateMessageReactions):
+            results = update.reactions.results or []
+            reactions_by_id[update.msg_id] = sum(r.count for r in results)
+    for post in refreshed:
+        if post['id'] in reactions_by_id:
+            post['reactions'] = reactions_by_id[post['id']]
+    return refreshed
+
+
+async def _fetch_recent_posts(client, entity) -> list:
+    """
+    Повертає останні _POSTS_WINDOW постів каналу.
+    Зберігає найновіший id (high-water mark) для кожного каналу: наступні
+    оновлення завантажують лише нові пости (min_id) та оновлюють лічильники
+    для решти вікна.
+    """
+    window_key = str(entity.id)
+    stored = _post_windows.get(window_key)
+    posts = None
+
+    if stored is not None:
+        window = stored[1]
+        new_messages = await client.get_messages(entity, limit=_POSTS_WINDOW, min_id=window['max_id'])
+        new_posts = [_snapshot_message(m) for m in new_messages]
+        if len(new_posts) >= _POSTS_WINDOW:
+            posts = new_posts[:_POSTS_WINDOW]
         else:
-            return f"https://t.me/c/{msg.peer_id.channel_id}/{msg.id}"
-
-    top_posts = []
-    for msg in sorted_posts[:3]:
-        top_posts.append({
-            'text': msg.message.split('\n')[0][:50] + '...',
-            'views': msg.views,
-            'link': get_post_link(msg)
-        })
-
-    flop_posts = []
-    for msg in sorted_posts[-3:]:
-        flop_posts.append({
-            'text': msg.message.split('\n')[0][:50] + '...',
-            'views': msg.views,
-            'link': get_post_link(msg)
-        })
-
-    # 4. Коефіцієнт Реакцій (RR)
-    reaction_rate = 0
-    if avg_views > 0:
-        reaction_rate = (avg_reactions / avg_views) * 100
-
-    # 5. --- 4. ОНОВЛЕНА ЛОГІКА СТАБІЛЬНОСТІ ---
-    # Ми рахуємо Min/Max ТІЛЬКИ по "зрілому" списку
-    min_views = min(mature_view_list) if mature_view_list else 0
-    max_views = max(mature_view_list) if mature_view_list else 0
-    # ----------------------------------------
-
-    return avg_views, er, posts_per_day, top_posts, flop_posts, reaction_rate, min_views, max_views
-
-
-# --- MAIN ASYNC FUNCTION (без змін) ---
-async def _internal_get_telegram_data(channel_url: str, is_pro_user: bool):
-    if not all([API_ID, API_HASH, SESSION_STRING]):
-        raise ValueError("API_ID, API_HASH та TELETHON_SESSION_STRING повинні бути встановлені в .env")
-
-    async with TelegramClient(StringSession(SESSION_STRING), int(API_ID), API_HASH) as client:
+            old_posts = window['posts'][:_POSTS_WINDOW - len(new_posts)]
+            old_posts = await _refresh_post_counters(client, entity, old_posts) if old_posts else []
+            if old_posts is not None:
+                posts = new_posts + old_posts
+                print(f"[INCREMENTAL] Канал {entity.id}: нових постів {len(new_posts)}, оновлено {len(old_posts)}")
+
+    if posts is None:
+        messages = await client.get_messages(entity, limit=_POSTS_WINDOW)
+        posts = [_snapshot_message(m) for m in messages]
+
+    if posts:
+        _post_windows.set(window_key, {
+            'max_id': max(post['id'] for post in posts),
+            'posts': posts,
+        }, ttl=_POST_WINDOW_TTL_SECONDS)
+    return posts
+
+
+# --- MAIN ASYNC FUNCTION ---
+# Повідомлення get_entity для username, якого не існує
+_ENTITY_NOT_FOUND_MESSAGES = ('No user has', 'Cannot find any entity', 'Could not find the input entity')
+
+
+async def _resolve_channel(client, channel_url: str):
+    """
+    Повертає (entity, full_channel_info). Якщо username уже є в індексі,
+    пропускає резолв (get_entity) і звертається до каналу напряму за id + access_hash.
+    """
+    channel_key = normalize_channel_url(channel_url)
+    scope = getattr(client, 'session_scope', 'default')
+
+    peer = lookup_peer(channel_key, scope)
+    if peer is not None:
+        channel_id, access_hash = peer
         try:
-            await client.connect()
-            if not await client.is_user_authorized():
-                print("ПОМИЛКА: Сесія Telethon не авторизована.")
-                return None
-                
-            entity = await client.get_entity(channel_url)
-            
-            full_channel_info = await client(GetFullChannelRequest(channel=entity))
-            subscribers_count = full_channel_info.full_chat.participants_count
-            channel_title = entity.title
-            entity_username = getattr(entity, 'username', None)
-
-            avatar_path = None
+            full_channel_info = await client(GetFullChannelRequest(
+                channel=InputChannel(channel_id=channel_id, access_hash=access_hash)
+            ))
+            entity = next((c for c in full_channel_info.chats if c.id == channel_id), None)
+            usernames = {u.lower() for u in _entity_usernames(entity)}
+            if entity is not None and channel_key in usernames:
+                return entity, full_channel_info
+            # Username тепер належить іншому каналу (або канал його змінив)
+            invalidate_peer(channel_key, scope)
+        except (ChannelInvalidError, ChannelPrivateError):
+            invalidate_peer(channel_key, scope)
+
+    try:
+        entity = await client.get_entity(channel_url)
+    except ValueError as e:
+        # Telethon повідомляє про неіснуючий username через ValueError
+        if str(e).startswith(_ENTITY_NOT_FOUND_MESSAGES):
+            raise TelegramFetchError(NOT_FOUND, str(e)) from e
+        raise
+    if not isinstance(entity, Channel):
+        # Користувач, бот або звичайна група - не канал
+        raise TelegramFetchError(NOT_FOUND, f"{type(entity).__name__} не є каналом")
+    full_channel_info = await client(GetFullChannelRequest(channel=entity))
+    remember_peer(channel_key, scope, entity.id, getattr(entity, 'access_hash', None))
+    return entity, full_channel_info
+
+
+def _entity_usernames(entity) -> list:
+    if entity is None:
+        return []
+    usernames = [entity.username] if getattr(entity, 'username', None) else []
+    for extra in getattr(entity, 'usernames', None) or []:
+        usernames.append(extra.username)
+    return usernames
+
+
+async def _load_channel_header(client, channel_url: str):
+    """Сутність каналу, кількість підписників та аватар."""
+    entity, full_channel_info = await _resolve_channel(client, channel_url)
+    subscribers_count = full_channel_info.full_chat.participants_count
+
+    avatar_path = None
+    try:
+        avatar_path = await get_channel_avatar(client, entity)
+    except Exception as e:
+        print(f"Помилка завантаження аватарки: {e}")
+
+    return entity, subscribers_count, avatar_path
+
+
+def _build_channel_data(entity, subscribers_count, channel_url, avatar_path, metrics, posts_analyzed):
+    """Повний (Pro) набір даних каналу; безкоштовний варіант - через project_for_tier()."""
+    (avg_views, er, posts_per_day, 
+     top_posts, flop_posts, 
+     reaction_rate, min_views, max_views) = metrics
+
+    data = {
+        "name": entity.title,
+        "username": getattr(entity, 'username', None),
+        "subscribers": subscribers_count,
+        "type": "Telegram Канал",
+        "is_private": False,
+        "platform": "telegram",
+        "url": channel_url,
+        "avg_views": int(avg_views),
+        "posts_analyzed": posts_analyzed,
+        "fetched_at": int(time.time()),
+        "avatar_path": avatar_path,
+        "avatar_file": avatar_static_file(avatar_path),
+        "er": er,
+        "posts_per_day": posts_per_day,
+        "top_posts": top_posts,
+        "flop_posts": flop_posts,
+        "reaction_rate": reaction_rate,
+        "min_views": min_views,
+        "max_views": max_views
+    }
+    return data
+
+
+def project_for_tier(data: dict | None, is_pro_user: bool, channel_url: str = None) -> dict | None:
+    """
+    Представлення повних даних каналу для тарифу користувача.
+    Для безкоштовного тарифу прибирає Pro-метрики; url - той, який ввів користувач.
+    """
+    if data is None:
+        return None
+    if is_pro_user:
+        projected = dict(data)
+    else:
+        projected = {key: value for key, value in data.items() if key not in PRO_ONLY_FIELDS}
+    if channel_url:
+        projected['url'] = channel_url
+    return projected
+
+
+async def _internal_get_telegram_data(client, channel_url: str):
+    """
+    Виконується у фоновому loop менеджера клієнтів.
+    client - вже підключений та авторизований TelegramClient з пулу.
+    Будь-який збій піднімається як TelegramFetchError.
+    """
+    try:
+        entity, subscribers_count, avatar_path = await _load_channel_header(client, channel_url)
+        entity_username = getattr(entity, 'username', None)
+
+        posts = await _fetch_recent_posts(client, entity)
+        metrics = calculate_pro_metrics(posts, subscribers_count, entity_username)
+
+        return _build_channel_data(entity, subscribers_count, channel_url, avatar_path,
+                                   metrics, len(posts))
+
+    except Exception as e:
+        failure = classify_exception(e)
+        print(f"Помилка Telegram для '{channel_url}' ({failure.kind}): {e}")
+        if failure is e:
+            raise  # уже типізована (напр. канал не знайдено в _resolve_channel)
+        raise failure from e
+
+
+async def _internal_get_telegram_data_deep(client, channel_url: str, max_posts: int, max_seconds: float,
+                                           progress_callback=None, acquire_budget=None):
+    """
+    Глибокий аналіз: потоково проходить до max_posts постів через iter_messages,
+    оновлюючи лише акумулятори StreamingPostMetrics (пам'ять не росте з історією).
+    Зупиняється, щойно вичерпано max_seconds. acquire_budget() викликається перед
+    кожною сторінкою історії, тож запити з вищих смуг вклинюються між сторінками.
+    """
+    try:
+        entity, subscribers_count, avatar_path = await _load_channel_header(client, channel_url)
+        entity_username = getattr(entity, 'username', None)
+
+        accumulator = StreamingPostMetrics()
+        deadline = time.monotonic() + max_seconds
+        truncated = False
+
+        if acquire_budget:
+            await acquire_budget()
+        async for message in client.iter_messages(entity, limit=max_posts):
+            accumulator.add(_snapshot_message(message))
+            # iter_messages завантажує історію сторінками по _DEEP_POSTS_PER_BUDGET_UNIT постів
+            if acquire_budget and accumulator.count % _DEEP_POSTS_PER_BUDGET_UNIT == 0 and accumulator.count < max_posts:
+                await acquire_budget()
+            if progress_callback and accumulator.count % _DEEP_PROGRESS_EVERY == 0:
+                progress_callback(accumulator.count, max_posts)
+            if time.monotonic() >= deadline:
+                truncated = True
+                print(f"[DEEP] Ліміт часу ({max_seconds} с) для {channel_url}: оброблено {accumulator.count} постів")
+                break
+
+        if progress_callback:
+            progress_callback(accumulator.count, max_posts)
+
+        metrics = accumulator.result(subscribers_count, entity_username)
+        data = _build_channel_data(entity, subscribers_count, channel_url, avatar_path,
+                                   metrics, accumulator.count)
+        data["analysis_mode"] = "deep"
+        data["deep_truncated"] = truncated
+        return data
+
+    except Exception as e:
+        failure = classify_exception(e)
+        print(f"Помилка Telegram (deep) для '{channel_url}' ({failure.kind}): {e}")
+        if failure is e:
+            raise  # уже типізована (напр. канал не знайдено в _resolve_channel)
+        raise failure from e
+
+
+async def _internal_get_telegram_data_many(client, channel_urls: list, concurrency: int, acquire_budget=None):
+    """
+    Обробляє кілька каналів на одному клієнті, не більше concurrency одночасно.
+    Бюджет списується по одному каналу перед його запитом (acquire_budget), тож
+    пакет іде в темпі планувальника, а запити з вищих смуг проходять між каналами.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _fetch_one(channel_url):
+        async with semaphore:
             try:
-                unique_filename = f"{entity.id}_{uuid.uuid4()}.jpg"
-                temp_path = os.path.join(TEMP_AVATAR_DIR, unique_filename)
-                await client.download_profile_photo(entity, file=temp_path)
-                if os.path.exists(temp_path):
-                    avatar_path = temp_path
-                    print(f"Аватар успішно завантажено у: {avatar_path}")
-                else:
-                    print(f"Канал {channel_title} не має фото профілю.")
+                if acquire_budget:
+                    await acquire_budget()
+                return await _internal_get_telegram_data(client, channel_url)
             except Exception as e:
-                print(f"Помилка завантаження аватарки: {e}")
-
-            messages = await client.get_messages(entity, limit=20)
-            
-            (avg_views, er, posts_per_day, 
-             top_posts, flop_posts, 
-             reaction_rate, min_views, max_views) = _calculate_telegram_pro_metrics(messages, subscribers_count, entity_username)
-
-            data = {
-                "name": channel_title,
-                "username": entity_username,
-                "subscribers": subscribers_count,
-                "type": "Telegram Канал",
-                "is_private": False,
-                "platform": "telegram",
-                "url": channel_url,
-                "avg_views": int(avg_views),
-                "avatar_path": avatar_path 
-            }
-            
-            if is_pro_user:
-                data["er"] = er
-                data["posts_per_day"] = posts_per_day
-                data["top_posts"] = top_posts
-                data["flop_posts"] = flop_posts
-                data["reaction_rate"] = reaction_rate
-                data["min_views"] = min_views
-                data["max_views"] = max_views
+                return e
 
-            return data
+    return await asyncio.gather(*(_fetch_one(url) for url in channel_urls))
 
-        except (ChannelInvalidError, ChannelPrivateError):
-            print(f"Помилка: Канал '{channel_url}' не знайдено або він приватний.")
-            return None
-        except ValueError:
-            print(f"Помилка: Неправильний URL каналу '{channel_url}'.")
-            return None
-        except Exception as e:
-            print(f"Загальна помилка Telethon: {e}")
+
+# --- STALE-WHILE-REVALIDATE ---
+def _schedule_revalidation(cache_key: str, channel_url: str):
+    """Фонове оновлення простроченого запису (не більше одного на ключ у процесі)."""
+    with _revalidating_lock:
+        if cache_key in _revalidating:
+            return
+        _revalidating.add(cache_key)
+
+    def _revalidate():
+        try:
+            print(f"[SWR] Фонове оновлення {cache_key}")
+            get_telegram_data(channel_url, True, force_fresh=True, lane=LANE_BACKGROUND)
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(cache_key)
+
+    _revalidation_executor.submit(_revalidate)
+
+
+# --- НЕГАТИВНИЙ КЕШ ---
+def _get_cached_failure(channel_url: str) -> TelegramFetchError | None:
+    cached = _cache.get(_FAILURE_KEY_PREFIX + normalize_channel_url(channel_url))
+    if cached is None:
+        return None
+    failure = TelegramFetchError.from_dict(cached[1])
+    print(f"[CACHE FAILURE] Відомий збій для {channel_url}: {failure.kind}")
+    return failure
+
+
+def _remember_failure(channel_url: str, failure: TelegramFetchError):
+    if failure.ttl <= 0:
+        return
+    _cache.set(_FAILURE_KEY_PREFIX + normalize_channel_url(channel_url), failure.to_dict(), ttl=failure.ttl)
+    if failure.kind in (NOT_FOUND, PRIVATE):
+        # Канал зник або закрився - старі дані більше не віддаємо
+        _cache.delete(_channel_cache_key(channel_url))
+
+
+# --- PUBLIC SYNC WRAPPER ---
+def _channel_cache_key(channel_url: str) -> str:
+    # Ключ не залежить від тарифу: дані завжди отримуються повні (Pro)
+    return normalize_channel_url(channel_url)
+
+
+def _get_cached(cache_key: str, ttl: float = _CACHE_TIMEOUT_SECONDS, allow_stale: bool = False) -> dict | None:
+    """
+    Повертає дані з кешу з позначкою віку (cache_age_seconds).
+    Прострочений запис у межах вікна SWR повертається лише з allow_stale=True
+    і позначається is_stale=True.
+    """
+    cached = _cache.get(cache_key)
+    if cached is None:
+        return None
+    timestamp, data = cached
+    age = time.time() - timestamp
+    if age >= ttl:
+        if not allow_stale or age >= ttl + SWR_GRACE_SECONDS:
             return None
+        data['is_stale'] = True
+        print(f"[CACHE SWR] Повертаю прострочені дані для {cache_key} (вік {int(age)} с)")
+    else:
+        print(f"[CACHE] Повертаю дані для {cache_key}")
+    data['cache_age_seconds'] = int(age)
+    return data
+
+
+def _default_lane(is_pro_user: bool) -> str:
+    return LANE_PRO if is_pro_user else LANE_FREE
+
+
+def get_telegram_data(channel_url: str, is_pro_user: bool, force_fresh: bool = False,
+                      allow_stale: bool = True, raise_errors: bool = False, lane: str = None) -> dict | None:
+    """
+    Дані каналу з кешу або з Telegram. Канал завантажується один раз у повному
+    (Pro) обсязі для всіх тарифів, project_for_tier() відрізає зайве при читанні.
+    При збої повертає None, а з raise_errors=True піднімає TelegramFetchError
+    (тип збою та повідомлення для користувача). Відомі збої відповідають
+    з негативного кешу без звернення до Telegram.
+    lane - смуга пріоритету запиту до Telegram (за замовчуванням - за тарифом).
+    """
+    cache_key = _channel_cache_key(channel_url)
+    lane = lane or _default_lane(is_pro_user)
+
+    try:
+        if not force_fresh:
+            data = _get_cached(cache_key, allow_stale=allow_stale)
+            if data is not None:
+                if data.get('is_stale'):
+                    _schedule_revalidation(cache_key, channel_url)
+                return project_for_tier(data, is_pro_user, channel_url)
+
+        failure = _get_cached_failure(channel_url)
+        if failure is not None:
+            raise failure
 
-# --- PUBLIC SYNC WRAPPER (без змін) ---
-def get_telegram_data(channel_url: str, is_pro_user: bool, force_fresh: bool = False) -> dict | None:
-    now = time.time()
-    cache_key = f"{channel_url}_{is_pro_user}"
-    
-    if not force_fresh and cache_key in _cache:
-        timestamp, data = _cache[cache_key]
-        if now - timestamp < _CACHE_TIMEOUT_SECONDS:
-            if 'avatar_path' in data:
-                data['avatar_path'] = None
-            print(f"[CACHE] Повертаю дані для {cache_key} (без аватарки)")
+        def _fetch():
+            print(f"[API (Force Fresh: {force_fresh})] Роблю запит до Telegram для {cache_key}")
+            try:
+                data = get_client_manager().run(
+                    lambda client: _internal_get_telegram_data(client, channel_url),
+                    lane=lane
+                )
+            except Exception as e:
+                failure = classify_exception(e)
+                _remember_failure(channel_url, failure)
+                raise failure from e
+            _cache.set(cache_key, data, ttl=_CACHE_TIMEOUT_SECONDS + SWR_GRACE_SECONDS)
             return data
-            
-    print(f"[API (Force Fresh: {force_fresh})] Роблю запит до Telegram для {cache_key}")
+
+        def _recheck():
+            # Інший воркер щойно завершив такий самий запит - беремо його результат з кешу
+            failure = _get_cached_failure(channel_url)
+            if failure is not None:
+                raise failure
+            return _get_cached(cache_key)
+
+        data = _single_flight.do(cache_key, _fetch, recheck=_recheck)
+        return project_for_tier(data, is_pro_user, channel_url)
+    except Exception as e:
+        failure = classify_exception(e)
+        print(f"Не вдалося отримати дані Telegram для {cache_key} ({failure.kind}): {e}")
+        if raise_errors:
+            raise failure from e
+        return None
+
+
+def get_telegram_data_many(channel_urls: list, is_pro_user: bool, force_fresh: bool = False,
+                           concurrency: int = None, lane: str = None) -> dict:
+    """
+    Отримує дані для багатьох каналів за один виклик на одному клієнті.
+    Повертає {url: {'data': dict | None, 'error': str | None, 'error_kind': str | None}}
+    для кожного URL. Кеш (і негативний кеш) використовується і поповнюється
+    так само, як у get_telegram_data.
+    """
+    concurrency = max(1, concurrency or _BATCH_CONCURRENCY)
+    lane = lane or _default_lane(is_pro_user)
+    results = {}
+    pending = {}  # cache_key -> перший URL цього каналу
+    fetched_by_key = {}
+
+    for channel_url in dict.fromkeys(channel_urls):
+        cache_key = _channel_cache_key(channel_url)
+        data = None if force_fresh else _get_cached(cache_key, allow_stale=True)
+        if data is not None:
+            if data.get('is_stale'):
+                _schedule_revalidation(cache_key, channel_url)
+            results[channel_url] = {'data': project_for_tier(data, is_pro_user, channel_url),
+                                    'error': None, 'error_kind': None}
+            continue
+        failure = _get_cached_failure(channel_url)
+        if failure is not None:
+            results[channel_url] = {'data': None, 'error': failure.user_message, 'error_kind': failure.kind}
+        else:
+            pending.setdefault(cache_key, channel_url)
+
+    if pending:
+        urls_to_fetch = list(pending.values())
+        print(f"[API BATCH] Роблю запит до Telegram для {len(urls_to_fetch)} каналів (паралельно: {concurrency})")
+        waves = math.ceil(len(urls_to_fetch) / concurrency)
+        manager = get_client_manager()
+        try:
+            fetched = manager.run(
+                lambda client: _internal_get_telegram_data_many(client, urls_to_fetch, concurrency,
+                                                                lambda: manager.acquire_budget(lane)),
+                timeout=_BATCH_WAVE_TIMEOUT_SECONDS * waves,
+                lane=lane, cost=0
+            )
+        except Exception as e:
+            print(f"Помилка пакетного запиту до Telegram: {e}")
+            fetched = [e] * len(urls_to_fetch)
+
+        for (cache_key, channel_url), outcome in zip(pending.items(), fetched):
+            if isinstance(outcome, Exception):
+                outcome = classify_exception(outcome)
+                _remember_failure(channel_url, outcome)
+            else:
+                _cache.set(cache_key, outcome, ttl=_CACHE_TIMEOUT_SECONDS + SWR_GRACE_SECONDS)
+            fetched_by_key[cache_key] = outcome
+
+        for channel_url in dict.fromkeys(channel_urls):
+            if channel_url in results:
+                continue
+            outcome = fetched_by_key[_channel_cache_key(channel_url)]
+            if isinstance(outcome, TelegramFetchError):
+                results[channel_url] = {'data': None, 'error': outcome.user_message, 'error_kind': outcome.kind}
+            else:
+                results[channel_url] = {'data': project_for_tier(outcome, is_pro_user, channel_url),
+                                        'error': None, 'error_kind': None}
+
+    return results
+
+
+def get_telegram_data_deep(channel_url: str, max_posts: int = None, max_seconds: float = None,
+                           force_fresh: bool = False, progress_callback=None,
+                           raise_errors: bool = False) -> dict | None:
+    """
+    Pro-аналіз глибокої історії каналу (до max_posts постів, не довше max_seconds).
+    progress_callback(processed, total) викликається з фонового потоку менеджера.
+    Збої обробляються так само, як у get_telegram_data.
+    """
+    max_posts = max_posts or DEEP_MAX_POSTS
+    max_seconds = max_seconds or _DEEP_MAX_SECONDS
+    cache_key = f"{normalize_channel_url(channel_url)}_deep_{max_posts}"
+
     try:
-        data = asyncio.run(_internal_get_telegram_data(channel_url, is_pro_user))
-        
-        if data:
-            _cache[cache_key] = (now, data)
-        return data
-        
+        if not force_fresh:
+            data = _get_cached(cache_key, ttl=_DEEP_CACHE_TIMEOUT_SECONDS)
+            if data is not None:
+                return data
+
+        failure = _get_cached_failure(channel_url)
+        if failure is not None:
+            raise failure
+
+        def _fetch():
+            print(f"[API DEEP] Глибокий аналіз {cache_key} (до {max_posts} постів, {max_seconds} с)")
+            manager = get_client_manager()
+            try:
+                # Заголовок каналу - одна одиниця бюджету, кожна сторінка історії - ще одна
+                data = manager.run(
+                    lambda client: _internal_get_telegram_data_deep(client, channel_url, max_posts, max_seconds,
+                                                                    progress_callback,
+                                                                    lambda: manager.acquire_budget(LANE_PRO)),
+                    timeout=max_seconds + _BATCH_WAVE_TIMEOUT_SECONDS,
+                    lane=LANE_PRO
+                )
+            except Exception as e:
+                failure = classify_exception(e)
+                _remember_failure(channel_url, failure)
+                raise failure from e
+            _cache.set(cache_key, data, ttl=_DEEP_CACHE_TIMEOUT_SECONDS)
+            return data
+
+        return _single_flight.do(cache_key, _fetch)
     except Exception as e:
-        print(f"Помилка при запуску asyncio.run для Telegram: {e}")
-        return None
\ No newline at end of file
+        failure = classify_exception(e)
+        print(f"Помилка глибокого аналізу Telegram для {cache_key} ({failure.kind}): {e}")
+        if raise_errors:
+            raise failure from e
+        return None
+
+
+def get_cache_stats() -> dict:
+    """Статистика кешу аналітики (hits / misses / evictions)."""
+    return _cache.stats()
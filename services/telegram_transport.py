@@ -0,0 +1,312 @@
+import os
+import json
+import uuid
+import random
+import base64
+import hashlib
+import builtins
+import telethon.errors
+from telethon import TelegramClient
+from telethon.sessions import StringSession
+from telethon.tl import types
+from telethon.tl.types import messages as messages_types
+from telethon.tl.functions.messages import GetMessagesViewsRequest, GetMessagesReactionsRequest
+from telethon.tl.tlobject import TLObject
+from telethon.extensions import BinaryReader
+from services.fake_telegram import FakeTelegramClient, simulate_network, FAKE_LATENCY_MS
+from utils import normalize_channel_url
+
+# --- Вибір транспорту ---
+# live   - справжній Telegram (за замовчуванням)
+# fake   - синтетичний бекенд (services.fake_telegram), без мережі та сесій
+# record - справжній Telegram + запис відповідей у TELEGRAM_RECORDINGS_DIR
+# replay - відтворення записаних відповідей, без мережі та сесій
+TRANSPORT_LIVE = 'live'
+TRANSPORT_FAKE = 'fake'
+TRANSPORT_RECORD = 'record'
+TRANSPORT_REPLAY = 'replay'
+
+TRANSPORT = os.environ.get('TELEGRAM_TRANSPORT', TRANSPORT_LIVE).lower()
+RECORDINGS_DIR = os.environ.get(
+    'TELEGRAM_RECORDINGS_DIR',
+    os.path.join(os.path.dirname(__file__), '..', 'instance', 'telegram_recordings')
+)
+# Скільки "сесій" створювати для fake / replay, якщо справжні не задані
+OFFLINE_SESSIONS = int(os.environ.get('TELEGRAM_OFFLINE_SESSIONS', 1))
+
+if TRANSPORT not in (TRANSPORT_LIVE, TRANSPORT_FAKE, TRANSPORT_RECORD, TRANSPORT_REPLAY):
+    print(f"ПОПЕРЕДЖЕННЯ: Невідомий TELEGRAM_TRANSPORT='{TRANSPORT}', використовую live")
+    TRANSPORT = TRANSPORT_LIVE
+elif TRANSPORT != TRANSPORT_LIVE:
+    print(f"[TG TRANSPORT] Транспорт Telegram: {TRANSPORT}")
+
+
+def needs_credentials() -> bool:
+    """Чи потрібні справжні API_ID / API_HASH / сесії."""
+    return TRANSPORT in (TRANSPORT_LIVE, TRANSPORT_RECORD)
+
+
+def offline_session_names() -> list:
+    return [f"{TRANSPORT}-{i}" for i in range(max(1, OFFLINE_SESSIONS))]
+
+
+def create_client(session_string: str, api_id: int, api_hash: str, **kwargs):
+    """Клієнт для одного слоту пулу відповідно до TELEGRAM_TRANSPORT."""
+    if TRANSPORT == TRANSPORT_FAKE:
+        return FakeTelegramClient(session_string)
+    if TRANSPORT == TRANSPORT_REPLAY:
+        return ReplayTelegramClient(RECORDINGS_DIR)
+    client = TelegramClient(StringSession(session_string), api_id, api_hash, **kwargs)
+    if TRANSPORT == TRANSPORT_RECORD:
+        return RecordingTelegramClient(client, RECORDINGS_DIR)
+    return client
+
+
+# --- Ключі та формат записів ---
+
+def _key_part(value):
+    """Стабільне представлення аргументу виклику (сутності - лише за id)."""
+    if isinstance(value, TLObject):
+        peer_id = getattr(value, 'channel_id', None)
+        if peer_id is None and isinstance(value, (types.Channel, types.Chat, types.User)):
+            peer_id = value.id
+        if peer_id is not None:
+            return f"peer:{peer_id}"
+        return {'_': type(value).__name__, **{k: _key_part(v) for k, v in vars(value).items()}}
+    if isinstance(value, (list, tuple)):
+        return [_key_part(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _key_part(v) for k, v in value.items()}
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    return value
+
+
+def _call_key(method: str, *args, **kwargs) -> str:
+    payload = json.dumps([method, _key_part(list(args)), _key_part(kwargs)], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _encode(value) -> dict:
+    if value is None:
+        return {'none': True}
+    if isinstance(value, TLObject):
+        return {'tl': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, (list, tuple)):
+        return {'list': [_encode(v) for v in value], 'total': getattr(value, 'total', None)}
+    if isinstance(value, bytes):
+        return {'bytes': base64.b64encode(value).decode('ascii')}
+    return {'value': value}
+
+
+def _decode(payload: dict):
+    if 'tl' in payload:
+        with BinaryReader(base64.b64decode(payload['tl'])) as reader:
+            return reader.tgread_object()
+    if 'list' in payload:
+        return [_decode(v) for v in payload['list']]
+    if 'bytes' in payload:
+        return base64.b64decode(payload['bytes'])
+    return payload.get('value')
+
+
+def _encode_error(error: Exception) -> dict:
+    return {'type': type(error).__name__, 'message': str(error), 'seconds': getattr(error, 'seconds', None)}
+
+
+def _decode_error(payload: dict) -> Exception:
+    error_cls = getattr(telethon.errors, payload['type'], None)
+    if error_cls is not None:
+        if payload.get('seconds') is not None:
+            return error_cls(request=None, capture=payload['seconds'])
+        return error_cls(request=None)
+    error_cls = getattr(builtins, payload['type'], None)
+    if isinstance(error_cls, type) and issubclass(error_cls, Exception):
+        return error_cls(payload['message'])
+    return RuntimeError(payload['message'])
+
+
+class ReplayMissError(LookupError):
+    """Для цього виклику немає запису."""
+
+
+class _RecordingStore:
+    """Записи відповідей: один JSON-файл на ключ виклику (спільний для воркерів)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def save(self, key: str, method: str, result=None, error: Exception = None, file_bytes: bytes = None):
+        try:
+            self._write(key, method, result, error, file_bytes)
+        except Exception as e:
+            # Збій запису не повинен ламати справжній запит
+            print(f"[TG RECORD] Не вдалося зберегти запис {method} ({key}): {e}")
+
+    def _write(self, key: str, method: str, result, error: Exception, file_bytes: bytes):
+        entry = {'method': method}
+        if error is not None:
+            entry['error'] = _encode_error(error)
+        else:
+            entry['result'] = _encode(result)
+        if file_bytes is not None:
+            entry['file'] = base64.b64encode(file_bytes).decode('ascii')
+        # Атомарний запис: паралельні воркери не бачать напівзаписаний файл
+        part_path = f"{self._path(key)}.part-{uuid.uuid4().hex}"
+        with open(part_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(part_path, self._path(key))
+
+    def load(self, key: str) -> dict | None:
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class RecordingTelegramClient:
+    """Обгортка над справжнім TelegramClient, що записує кожну відповідь."""
+
+    def __init__(self, client: TelegramClient, directory: str):
+        self._client = client
+        self._store = _RecordingStore(directory)
+
+    async def connect(self):
+        await self._client.connect()
+
+    def is_connected(self) -> bool:
+        return self._client.is_connected()
+
+    async def is_user_authorized(self) -> bool:
+        return await self._client.is_user_authorized()
+
+    async def disconnect(self):
+        await self._client.disconnect()
+
+    async def _record(self, method: str, key: str, coro):
+        try:
+            result = await coro
+        except Exception as e:
+            self._store.save(key, method, error=e)
+            raise
+        self._store.save(key, method, result=result)
+        return result
+
+    async def get_entity(self, channel_url: str):
+        key = _call_key('get_entity', normalize_channel_url(channel_url))
+        return await self._record('get_entity', key, self._client.get_entity(channel_url))
+
+    async def __call__(self, request):
+        key = _call_key('call', request)  # до виклику: Telethon змінює request при resolve
+        return await self._record('call', key, self._client(request))
+
+    async def get_messages(self, entity, limit: int = None, min_id: int = None):
+        key = _call_key('get_messages', entity, limit=limit, min_id=min_id)
+        kwargs = {'limit': limit}
+        if min_id is not None:
+            kwargs['min_id'] = min_id
+        result = await self._record('get_messages', key, self._client.get_messages(entity, **kwargs))
+        return result
+
+    async def iter_messages(self, entity, limit: int = None):
+        key = _call_key('iter_messages', entity, limit=limit)
+        recorded = []
+        try:
+            async for message in self._client.iter_messages(entity, limit=limit):
+                recorded.append(message)
+                yield message
+        finally:
+            # Зберігаємо те, що встигли прочитати (глибокий аналіз може зупинитись раніше)
+            self._store.save(key, 'iter_messages', result=recorded)
+
+    async def download_profile_photo(self, entity, file: str = None):
+        key = _call_key('download_profile_photo', entity)
+        path = await self._client.download_profile_photo(entity, file=file)
+        file_bytes = None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                file_bytes = f.read()
+        self._store.save(key, 'download_profile_photo', result=None, file_bytes=file_bytes)
+        return path
+
+
+class ReplayTelegramClient:
+    """
+    Відтворює відповіді, записані RecordingTelegramClient, без мережі.
+    Затримка імітується так само, як у синтетичному бекенді.
+    """
+
+    def __init__(self, directory: str, latency_ms: float = FAKE_LATENCY_MS):
+        self._store = _RecordingStore(directory)
+        self.latency_ms = latency_ms
+        self._rng = random.Random()
+        self._connected = False
+
+    async def connect(self):
+        self._connected = True
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    async def disconnect(self):
+        self._connected = False
+
+    async def _replay(self, method: str, key: str):
+        await simulate_network(self._rng, self.latency_ms)
+        entry = self._store.load(key)
+        if entry is None:
+            raise ReplayMissError(f"Немає запису для виклику {method} ({key})")
+        if 'error' in entry:
+            raise _decode_error(entry['error'])
+        return entry
+
+    async def get_entity(self, channel_url: str):
+        entry = await self._replay('get_entity', _call_key('get_entity', normalize_channel_url(channel_url)))
+        return _decode(entry['result'])
+
+    async def __call__(self, request):
+        try:
+            entry = await self._replay('call', _call_key('call', request))
+        except ReplayMissError:
+            # Оновлення лічильників для іншого набору постів, ніж під час запису:
+            # "невідомі" перегляди змушують парсер перечитати вікно постів повністю
+            if isinstance(request, GetMessagesViewsRequest):
+                return messages_types.MessageViews(views=[types.MessageViews() for _ in request.id],
+                                                   chats=[], users=[])
+            if isinstance(request, GetMessagesReactionsRequest):
+                return types.Updates(updates=[], users=[], chats=[], date=None, seq=0)
+            raise
+        return _decode(entry['result'])
+
+    async def get_messages(self, entity, limit: int = None, min_id: int = None):
+        try:
+            entry = await self._replay('get_messages', _call_key('get_messages', entity, limit=limit, min_id=min_id))
+            return _decode(entry['result'])
+        except ReplayMissError:
+            if min_id is None:
+                raise
+        # Інкрементальний запит, якого не було під час запису: беремо повне вікно
+        # і відрізаємо вже відомі пости
+        entry = await self._replay('get_messages', _call_key('get_messages', entity, limit=limit, min_id=None))
+        return [m for m in _decode(entry['result']) if m.id > min_id]
+
+    async def iter_messages(self, entity, limit: int = None):
+        entry = await self._replay('iter_messages', _call_key('iter_messages', entity, limit=limit))
+        for message in _decode(entry['result']):
+            yield message
+
+    async def download_profile_photo(self, entity, file: str = None):
+        entry = await self._replay('download_profile_photo', _call_key('download_profile_photo', entity))
+        if not entry.get('file'):
+            return None
+        with open(file, 'wb') as f:
+            f.write(base64.b64decode(entry['file']))
+        return file
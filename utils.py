@@ -26,4 +26,34 @@ def detect_platform(url: str) -> str:
     except Exception:
         return 'unknown'
 
+def normalize_channel_url(url: str) -> str:
+    """
+    Повертає канонічний ключ каналу Telegram для кешу та дедуплікації:
+    'https://t.me/Durov/', '@durov' та 't.me/s/durov' -> 'durov'.
+    Інвайт-посилання (t.me/+HASH, t.me/joinchat/HASH) зберігають регістр.
+    """
+    key = (url or '').strip()
+    if key.startswith('@'):
+        return key[1:].lower()
+
+    if not key.startswith('http://') and not key.startswith('https://'):
+        key = 'https://' + key
+    parsed_url = urlparse(key)
+    domain = parsed_url.netloc.lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    if domain not in ('t.me', 'telegram.me'):
+        return (url or '').strip().lower()
+
+    parts = [p for p in parsed_url.path.split('/') if p]
+    if not parts:
+        return ''
+    if parts[0] == 's' and len(parts) > 1:
+        parts = parts[1:]
+    if parts[0].startswith('+'):
+        return parts[0]
+    if parts[0] == 'joinchat' and len(parts) > 1:
+        return f"joinchat/{parts[1]}"
+    return parts[0].lower()
+
 # --- extract_instagram_username() ВИДАЛЕНО ---
\ No newline at end of file